@@ -0,0 +1,78 @@
+"""
+Microbenchmark of message decoding cost per event type.
+
+Compares the previous two-pass decoding (BaseEvent, then the concrete class)
+with the single-pass discriminated union used by EventRegistry.
+
+Usage:
+    python -m benchmarks.decode_events [--iterations N]
+"""
+
+import argparse
+import timeit
+from benchmarks.sample_events import SAMPLE_EVENTS, sample_body
+from src.consumers.registry import EventRegistry
+from src.schemas.assignment_event import AssignmentCreated, AssignmentReminder
+from src.schemas.base_event import BaseEvent
+from src.schemas.enrollment_event import (
+    EnrolledStudentToCourseEvent,
+    UnenrolledStudentFromCourseEvent,
+)
+from src.schemas.feedback_event import FeedbackCreatedEvent
+from src.schemas.forum_event import ForumActivityEvent
+from src.schemas.submission_event import SubmissionCorrectedEvent
+from src.schemas.teacher_event import AuxTeacherAddedEvent, AuxTeacherRemovedEvent
+
+EVENT_CLASSES = [
+    AssignmentCreated,
+    AssignmentReminder,
+    AuxTeacherAddedEvent,
+    AuxTeacherRemovedEvent,
+    FeedbackCreatedEvent,
+    EnrolledStudentToCourseEvent,
+    UnenrolledStudentFromCourseEvent,
+    ForumActivityEvent,
+    SubmissionCorrectedEvent,
+]
+
+
+async def _noop_handler(db, event):
+    pass
+
+
+def build_registry() -> EventRegistry:
+    registry = EventRegistry()
+    for event_class in EVENT_CLASSES:
+        registry.register(event_class, _noop_handler)
+    return registry
+
+
+def two_pass_decode(registry: EventRegistry, body: bytes):
+    event_type = BaseEvent.model_validate_json(body).event_type
+    return registry.get_event_class(event_type).model_validate_json(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event decoding microbenchmark")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    registry = build_registry()
+    print(f"{'event type':<22}{'two-pass (us)':>15}{'single-pass (us)':>18}")
+    for event_type in SAMPLE_EVENTS:
+        body = sample_body(event_type)
+        two_pass = timeit.timeit(
+            lambda: two_pass_decode(registry, body), number=args.iterations
+        )
+        single_pass = timeit.timeit(
+            lambda: registry.decode(body), number=args.iterations
+        )
+        print(
+            f"{event_type:<22}"
+            f"{two_pass / args.iterations * 1e6:>15.2f}"
+            f"{single_pass / args.iterations * 1e6:>18.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Local stand-ins for the service dependencies, used by the load benchmark.
+
+Every fake can inject latency so handler changes can be measured against
+slow upstreams without touching the network:
+
+- FakeBroker: RabbitMQ connection/channel/queues with in-memory deliveries
+- ServiceStubs: courses, users and gateway HTTP services (httpx.MockTransport)
+- FakeSMTPPool: drop-in for the pooled SMTP sender
+- FakeFCM: drop-in for firebase_admin.messaging.send_each_for_multicast
+"""
+
+import asyncio
+import hashlib
+import random
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+import httpx
+
+
+class Latency:
+    """Injected latency of `ms` milliseconds, varied by +/- `jitter` (a fraction)."""
+
+    def __init__(self, ms: float = 0.0, jitter: float = 0.0):
+        self.ms = ms
+        self.jitter = jitter
+
+    def seconds(self) -> float:
+        if self.ms <= 0:
+            return 0.0
+        spread = self.ms * self.jitter
+        return max(0.0, random.uniform(self.ms - spread, self.ms + spread)) / 1000
+
+    async def wait(self) -> None:
+        delay = self.seconds()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def block(self) -> None:
+        delay = self.seconds()
+        if delay:
+            time.sleep(delay)
+
+
+class FakeDelivery:
+    """An incoming message; records when it was received and settled."""
+
+    def __init__(self, body: bytes, message_id: str, headers: Optional[Dict] = None):
+        self.body = body
+        self.message_id = message_id
+        self.headers = headers or {}
+        self.content_type = "application/json"
+        self.received_at: Optional[float] = None
+        self.settled_at: Optional[float] = None
+        self.outcome: Optional[str] = None
+
+    def _settle(self, outcome: str) -> None:
+        self.settled_at = time.perf_counter()
+        self.outcome = outcome
+
+    async def ack(self, multiple: bool = False) -> None:
+        self._settle("ack")
+
+    async def nack(self, multiple: bool = False, requeue: bool = True) -> None:
+        self._settle("nack")
+
+    async def reject(self, requeue: bool = False) -> None:
+        self._settle("reject")
+
+
+class FakeQueueIterator:
+    def __init__(self, queue: "FakeQueue"):
+        self.queue = queue
+        self._closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> FakeDelivery:
+        while not self._closed:
+            if self.queue.deliveries:
+                delivery = self.queue.deliveries.pop(0)
+                delivery.received_at = time.perf_counter()
+                self.queue.broker.received.append(delivery)
+                return delivery
+            # Deliveries still being handled may publish more, e.g. fan-out chunks
+            if not self.queue.broker.busy():
+                break
+            await asyncio.sleep(0.01)
+        raise StopAsyncIteration
+
+    async def close(self) -> None:
+        self._closed = True
+
+
+class FakeQueue:
+    """
+    Holds deliveries in memory; iteration ends once the queue is drained and
+    no delivery of the broker is still being handled.
+    """
+
+    def __init__(self, broker: "FakeBroker", name: str):
+        self.broker = broker
+        self.name = name
+        self.deliveries: List[FakeDelivery] = []
+        self.bindings: List[tuple] = []
+
+    def iterator(self, **kwargs) -> FakeQueueIterator:
+        return FakeQueueIterator(self)
+
+    async def bind(self, exchange, routing_key: str = "", **kwargs) -> None:
+        self.bindings.append((getattr(exchange, "name", exchange), routing_key))
+
+
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    """Whether a topic binding key ('*' one word, '#' zero or more) matches."""
+
+    def match(words: List[str], keys: List[str]) -> bool:
+        if not words:
+            return not keys
+        if words[0] == "#":
+            return any(match(words[1:], keys[i:]) for i in range(len(keys) + 1))
+        if not keys:
+            return False
+        return words[0] in ("*", keys[0]) and match(words[1:], keys[1:])
+
+    return match(pattern.split("."), routing_key.split(".") if routing_key else [])
+
+
+class FakeExchange:
+    """Routes like a direct, topic or fanout exchange, with an alternate exchange."""
+
+    def __init__(
+        self,
+        broker: "FakeBroker",
+        name: str = "",
+        type: str = "direct",
+        arguments: Optional[Dict] = None,
+    ):
+        self.broker = broker
+        self.name = name
+        self.type = getattr(type, "value", type)
+        self.alternate = (arguments or {}).get("alternate-exchange")
+
+    def matches(self, binding_key: str, routing_key: str) -> bool:
+        if self.type == "fanout":
+            return True
+        if self.type == "topic":
+            return topic_matches(binding_key, routing_key)
+        return binding_key == routing_key
+
+    def route(self, routing_key: str) -> List["FakeQueue"]:
+        if not self.name:
+            return [self.broker.queue(routing_key)]
+        targets = [
+            queue
+            for queue in self.broker.queues.values()
+            if any(
+                exchange == self.name and self.matches(key, routing_key)
+                for exchange, key in queue.bindings
+            )
+        ]
+        if not targets and self.alternate in self.broker.exchanges:
+            return self.broker.exchanges[self.alternate].route(routing_key)
+        return targets
+
+    async def publish(self, message, routing_key: str, **kwargs) -> None:
+        self.broker.published[(self.name, routing_key)] += 1
+        for queue in self.route(routing_key):
+            queue.deliveries.append(
+                FakeDelivery(message.body, message.message_id, message.headers)
+            )
+
+
+class FakeChannel:
+    def __init__(self, broker: "FakeBroker"):
+        self.broker = broker
+        self.default_exchange = FakeExchange(broker)
+
+    async def set_qos(self, **kwargs) -> None:
+        pass
+
+    async def declare_queue(self, name: str, **kwargs) -> FakeQueue:
+        return self.broker.queue(name)
+
+    async def declare_exchange(
+        self,
+        name: str,
+        type: str = "direct",
+        arguments: Optional[Dict] = None,
+        **kwargs,
+    ) -> FakeExchange:
+        return self.broker.exchanges.setdefault(
+            name, FakeExchange(self.broker, name, type, arguments)
+        )
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeBroker:
+    """In-memory stand-in for the RabbitMQ connection the router opens."""
+
+    def __init__(self):
+        self.queues: Dict[str, FakeQueue] = {}
+        self.exchanges: Dict[str, FakeExchange] = {}
+        self.published: Counter = Counter()
+        # Every delivery handed to a consumer, in order
+        self.received: List[FakeDelivery] = []
+
+    def queue(self, name: str) -> FakeQueue:
+        if name not in self.queues:
+            self.queues[name] = FakeQueue(self, name)
+        return self.queues[name]
+
+    def busy(self) -> bool:
+        return any(delivery.settled_at is None for delivery in self.received)
+
+    async def connect(self) -> "FakeBroker":
+        """Replacement for get_rabbitmq_connection."""
+        return self
+
+    async def channel(self) -> FakeChannel:
+        return FakeChannel(self)
+
+    async def close(self) -> None:
+        pass
+
+
+def _submitted(student_id: str, assignment_id: str, ratio: float) -> bool:
+    digest = hashlib.sha256(f"{student_id}:{assignment_id}".encode()).digest()
+    return digest[0] / 256 < ratio
+
+
+class ServiceStubs:
+    """
+    Answers the courses, users and gateway endpoints the handlers call,
+    from an in-memory set of courses.
+
+    Args:
+        rosters: Student IDs per course
+        latency: Latency injected in every request
+        submitted_ratio: Share of students who already submitted an assignment
+        tokens_per_user: FCM tokens registered per user
+    """
+
+    def __init__(
+        self,
+        rosters: Dict[str, List[str]],
+        latency: Latency,
+        submitted_ratio: float = 0.3,
+        tokens_per_user: int = 1,
+    ):
+        self.rosters = rosters
+        self.latency = latency
+        self.submitted_ratio = submitted_ratio
+        self.tokens_per_user = tokens_per_user
+        self.requests: Counter = Counter()
+
+    def transport(self, upstream: str) -> httpx.MockTransport:
+        async def handle(request: httpx.Request) -> httpx.Response:
+            self.requests[upstream] += 1
+            await self.latency.wait()
+            return getattr(self, f"_{upstream}")(request)
+
+        return httpx.MockTransport(handle)
+
+    def _courses(self, request: httpx.Request) -> httpx.Response:
+        parts = request.url.path.strip("/").split("/")
+        if parts[0] == "courses" and parts[-1] == "enrollments":
+            students = self.rosters.get(parts[1], [])
+            return httpx.Response(
+                200, json=[{"student_id": s, "course_id": parts[1]} for s in students]
+            )
+        if parts[0] == "students" and parts[-1] == "submissions":
+            student_id = parts[1]
+            submissions = [
+                {"assignment_id": f"assignment-{i}", "status": "submitted"}
+                for i in range(5)
+                if _submitted(student_id, f"assignment-{i}", self.submitted_ratio)
+            ]
+            return httpx.Response(200, json=submissions)
+        if parts[0] == "forum" and parts[-1] == "participants":
+            students = self.rosters.get(parts[2], [])
+            return httpx.Response(
+                200, json={"participants": students[: max(1, len(students) // 2)]}
+            )
+        return httpx.Response(404)
+
+    def _users(self, request: httpx.Request) -> httpx.Response:
+        user_id = request.url.path.rstrip("/").split("/")[-1]
+        return httpx.Response(
+            200, json={"data": {"id": user_id, "email": f"{user_id}@example.com"}}
+        )
+
+    def _gateway(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "DELETE":
+            return httpx.Response(200)
+        uid = request.url.params.get("uid", "")
+        return httpx.Response(
+            200,
+            json=[{"fcm_token": f"{uid}-{i}"} for i in range(self.tokens_per_user)],
+        )
+
+
+class FakeSMTPPool:
+    """Accepts messages after the injected latency instead of sending them."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.sent = 0
+        self.recipients: Counter = Counter()
+
+    async def send_raw(self, sender, recipients: List[str], data: bytes) -> None:
+        await self.latency.wait()
+        self.sent += 1
+        for recipient in recipients:
+            self.recipients[recipient] += 1
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeFCM:
+    """Blocking send_each_for_multicast, like firebase_admin.messaging."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.batches = 0
+        self.tokens = 0
+
+    def send_each_for_multicast(self, message):
+        self.latency.block()
+        self.batches += 1
+        self.tokens += len(message.tokens)
+        responses = [
+            SimpleNamespace(success=True, exception=None) for _ in message.tokens
+        ]
+        return SimpleNamespace(
+            responses=responses, success_count=len(responses), failure_count=0
+        )
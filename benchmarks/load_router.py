@@ -0,0 +1,328 @@
+"""
+Load benchmark of the whole consumer: drives EventRouter.start() with a stream
+of all nine event types against local stand-ins for RabbitMQ, the database
+(SQLite through aiosqlite unless DATABASE_URL is set), the courses/users/gateway services,
+SMTP and FCM, each with configurable injected latency.
+
+Reports throughput, p50/p99 delivery-to-ack latency per event type and the
+cost per notified recipient. Results can be saved and compared against a
+previous run to measure a handler change against a baseline.
+
+Usage:
+    python -m benchmarks.load_router [--events N] [--students N] [--http-ms MS]
+        [--smtp-ms MS] [--fcm-ms MS] [--concurrency N]
+        [--priority-concurrency N] [--single-lane] [--chunk-size N] [--replay FILE]
+        [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import replace
+from types import SimpleNamespace
+from typing import Dict, List
+from benchmarks.fakes import (
+    FakeBroker,
+    FakeFCM,
+    FakeSMTPPool,
+    Latency,
+    ServiceStubs,
+)
+from benchmarks.sample_events import SAMPLE_EVENTS
+
+EVENT_TYPES = list(SAMPLE_EVENTS)
+
+
+def build_rosters(courses: int, students: int) -> Dict[str, List[str]]:
+    return {
+        f"course-{c}": [f"student-{c}-{s}" for s in range(students)]
+        for c in range(courses)
+    }
+
+
+def synthetic_stream(
+    count: int, rosters: Dict[str, List[str]], seed: int
+) -> List[bytes]:
+    """Events of every type in equal shares, for random courses and students."""
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(count):
+        event_type = EVENT_TYPES[i % len(EVENT_TYPES)]
+        course_id = rng.choice(list(rosters))
+        event = dict(SAMPLE_EVENTS[event_type], course_id=course_id)
+        if "student_id" in event:
+            event["student_id"] = rng.choice(rosters[course_id])
+        if "teacher_id" in event:
+            event["teacher_id"] = f"teacher-{course_id}"
+        if "assignment_id" in event:
+            event["assignment_id"] = f"assignment-{rng.randrange(5)}"
+        if "post_id" in event:
+            event["post_id"] = f"post-{i}"
+        bodies.append(json.dumps(event).encode())
+    rng.shuffle(bodies)
+    return bodies
+
+
+def replayed_stream(path: str) -> List[bytes]:
+    """Recorded message bodies, one JSON document per line."""
+    with open(path, "rb") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def seed_preferences(db, rosters: Dict[str, List[str]]) -> None:
+    from sqlalchemy import insert
+    from src.model.notification_preferences import NotificationPreferences
+
+    users = [uid for students in rosters.values() for uid in students]
+    users += [f"teacher-{course_id}" for course_id in rosters]
+    await db.execute(
+        insert(NotificationPreferences),
+        [
+            {
+                "uid": uid,
+                "event_type": event_type,
+                "email_enabled": True,
+                "push_enabled": True,
+                "digest_frequency": "immediate",
+            }
+            for uid in users
+            for event_type in EVENT_TYPES
+        ],
+    )
+    await db.commit()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run(args, bodies: List[bytes], rosters: Dict[str, List[str]]) -> Dict:
+    # Imported once the environment is set up, the modules read it on import
+    import src.consumers.event_router as event_router
+    import src.notifications.email as email
+    from src.clients.http import configure_upstream
+    from src.database.db import Base, SessionLocal, engine
+    from src.handlers.send_forum_notifications import send_forum_digests
+    from src.notifications.push import configure_push_backend
+    from src.rabbitmq.topology import (
+        Lane,
+        declare_lane_queue,
+        declare_notifications_exchange,
+    )
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        await seed_preferences(db, rosters)
+
+    http_latency = Latency(args.http_ms, args.jitter)
+    stubs = ServiceStubs(
+        rosters, http_latency, args.submitted_ratio, args.tokens_per_user
+    )
+    for upstream in ("courses", "users", "gateway"):
+        configure_upstream(upstream, transport=stubs.transport(upstream))
+    smtp = FakeSMTPPool(Latency(args.smtp_ms, args.jitter))
+    email.smtp_pool = smtp
+    fcm = FakeFCM(Latency(args.fcm_ms, args.jitter))
+    configure_push_backend(fcm)
+    broker = FakeBroker()
+    event_router.get_rabbitmq_connection = broker.connect
+
+    if args.single_lane:
+        lanes = [Lane("all", ("#",), args.concurrency, args.concurrency)]
+    else:
+        concurrency = {"priority": args.priority_concurrency, "bulk": args.concurrency}
+        lanes = [
+            replace(
+                lane,
+                max_concurrency=concurrency[lane.name],
+                prefetch_count=concurrency[lane.name],
+            )
+            for lane in event_router.EVENT_LANES
+        ]
+    router = event_router.EventRouter(lanes=lanes, default_lane=lanes[-1].name)
+
+    # Publish the stream the way producers do, through the exchange with the
+    # event type as routing key, so it lands on the lane queues
+    channel = await broker.channel()
+    exchange = await declare_notifications_exchange(channel)
+    for lane in lanes:
+        await declare_lane_queue(
+            channel, router.queue_name, lane, default=lane.name == router.default_lane
+        )
+    for i, body in enumerate(bodies):
+        await exchange.publish(
+            SimpleNamespace(body=body, message_id=f"bench-{i}", headers={}),
+            routing_key=str(json.loads(body).get("event_type", "")),
+        )
+    deliveries = [
+        delivery for queue in broker.queues.values() for delivery in queue.deliveries
+    ]
+    broker.published.clear()
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    await router.start()
+    if args.forum_window > 0:
+        # Forum posts were only buffered, send their digests without waiting
+        await send_forum_digests(window=0)
+    wall, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    await engine.dispose()
+
+    latencies = defaultdict(list)
+    # Fan-out chunks published while running are measured too
+    for delivery in broker.received:
+        if delivery.settled_at is None:
+            continue
+        event_type = json.loads(delivery.body).get("event_type", "unknown")
+        latencies[event_type].append(delivery.settled_at - delivery.received_at)
+    everything = [value for values in latencies.values() for value in values]
+    recipients = len(smtp.recipients)
+    deliveries_sent = smtp.sent + fcm.tokens
+
+    return {
+        "events": len(deliveries),
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "throughput": len(deliveries) / wall if wall else 0.0,
+        "p50_ms": percentile(everything, 50) * 1000,
+        "p99_ms": percentile(everything, 99) * 1000,
+        "per_event_type": {
+            event_type: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "mean_ms": statistics.fmean(values) * 1000,
+            }
+            for event_type, values in sorted(latencies.items())
+        },
+        "emails": smtp.sent,
+        "push_tokens": fcm.tokens,
+        "fcm_batches": fcm.batches,
+        "recipients": recipients,
+        "http_requests": dict(stubs.requests),
+        "retries_published": sum(
+            count for (exchange, _), count in broker.published.items() if not exchange
+        ),
+        "chunks_published": sum(
+            count
+            for (_, routing_key), count in broker.published.items()
+            if routing_key == "fanout.chunk"
+        ),
+        "cpu_ms_per_delivery": cpu / deliveries_sent * 1000 if deliveries_sent else 0,
+        "wall_ms_per_delivery": wall / deliveries_sent * 1000 if deliveries_sent else 0,
+    }
+
+
+def report(results: Dict, baseline: Dict = None) -> None:
+    def delta(key: str) -> str:
+        if not baseline or not baseline.get(key):
+            return ""
+        change = (results[key] - baseline[key]) / baseline[key] * 100
+        return f"  ({change:+.1f}% vs baseline)"
+
+    print(
+        f"{results['events']} events in {results['wall_seconds']:.2f}s "
+        f"({results['cpu_seconds']:.2f}s CPU)"
+    )
+    print(f"throughput: {results['throughput']:.1f} events/s{delta('throughput')}")
+    print(f"p50: {results['p50_ms']:.1f} ms{delta('p50_ms')}")
+    print(f"p99: {results['p99_ms']:.1f} ms{delta('p99_ms')}")
+    print(
+        f"deliveries: {results['emails']} emails to {results['recipients']} "
+        f"recipients, {results['push_tokens']} push tokens in "
+        f"{results['fcm_batches']} FCM batches"
+    )
+    print(
+        f"per delivery: {results['cpu_ms_per_delivery']:.3f} ms CPU"
+        f"{delta('cpu_ms_per_delivery')}, "
+        f"{results['wall_ms_per_delivery']:.3f} ms wall"
+        f"{delta('wall_ms_per_delivery')}"
+    )
+    print(f"HTTP requests: {results['http_requests']}")
+    if results["retries_published"]:
+        print(f"republished (retry/DLQ): {results['retries_published']}")
+    if results.get("chunks_published"):
+        print(f"fan-out chunks published: {results['chunks_published']}")
+    print()
+    print(f"{'event type':<22}{'count':>7}{'p50 (ms)':>11}{'p99 (ms)':>11}")
+    for event_type, stats in results["per_event_type"].items():
+        print(
+            f"{event_type:<22}{stats['count']:>7}"
+            f"{stats['p50_ms']:>11.1f}{stats['p99_ms']:>11.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event router load benchmark")
+    parser.add_argument("--events", type=int, default=900)
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--students", type=int, default=100, help="per course")
+    parser.add_argument("--concurrency", type=int, default=10, help="of the bulk lane")
+    parser.add_argument("--priority-concurrency", type=int, default=10)
+    parser.add_argument(
+        "--single-lane",
+        action="store_true",
+        help="consume every event type from one queue, as before the lanes",
+    )
+    parser.add_argument("--http-ms", type=float, default=20)
+    parser.add_argument("--smtp-ms", type=float, default=50)
+    parser.add_argument("--fcm-ms", type=float, default=100)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--submitted-ratio", type=float, default=0.3)
+    parser.add_argument("--tokens-per-user", type=int, default=1)
+    parser.add_argument("--forum-window", type=float, default=0)
+    parser.add_argument(
+        "--chunk-size", type=int, default=0, help="FANOUT_CHUNK_SIZE, 0 disables it"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--replay", help="JSON lines file of recorded bodies")
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--baseline", help="results JSON of a previous run")
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="events-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ["FORUM_COALESCE_WINDOW_SECONDS"] = str(args.forum_window)
+    os.environ["FANOUT_CHUNK_SIZE"] = str(args.chunk_size)
+    os.environ.setdefault("TRACING_EXPORTER", "none")
+    os.environ.setdefault("NOTIFICATIONS_QUEUE_NAME", "notifications")
+
+    rosters = build_rosters(args.courses, args.students)
+    bodies = (
+        replayed_stream(args.replay)
+        if args.replay
+        else synthetic_stream(args.events, rosters, args.seed)
+    )
+    random.seed(args.seed)
+
+    # Handlers log every recipient; keep the console out of the measurement
+    import src.consumers.event_router  # noqa: F401 creates the module loggers
+
+    for name in list(logging.Logger.manager.loggerDict):
+        logging.getLogger(name).setLevel(args.log_level)
+
+    results = asyncio.run(run(args, bodies, rosters))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
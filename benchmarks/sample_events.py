@@ -0,0 +1,75 @@
+"""Representative payloads for every event type the service consumes."""
+
+import json
+
+SAMPLE_EVENTS = {
+    "assignment.created": {
+        "event_type": "assignment.created",
+        "course_id": "course-1",
+        "assignment_id": "assignment-1",
+        "assignment_title": "Trabajo práctico 1",
+        "assignment_due_date": "2025-06-30T23:59:00",
+    },
+    "assignment.reminder": {
+        "event_type": "assignment.reminder",
+        "course_id": "course-1",
+        "assignment_id": "assignment-1",
+        "assignment_title": "Trabajo práctico 1",
+        "assignment_due_date": "2025-06-30T23:59:00",
+    },
+    "aux_teacher.added": {
+        "event_type": "aux_teacher.added",
+        "course_id": "course-1",
+        "course_name": "Algoritmos I",
+        "teacher_id": "teacher-1",
+    },
+    "aux_teacher.removed": {
+        "event_type": "aux_teacher.removed",
+        "course_id": "course-1",
+        "course_name": "Algoritmos I",
+        "teacher_id": "teacher-1",
+    },
+    "feedback.created": {
+        "event_type": "feedback.created",
+        "course_id": "course-1",
+        "student_id": "student-1",
+        "feedback_id": "feedback-1",
+        "feedback_text": "Muy buen trabajo, revisar la complejidad del punto 3.",
+        "feedback_rating": 4,
+        "feedback_created_at": "2025-06-01T10:00:00",
+    },
+    "student.enrolled": {
+        "event_type": "student.enrolled",
+        "course_id": "course-1",
+        "student_id": "student-1",
+    },
+    "student.unenrolled": {
+        "event_type": "student.unenrolled",
+        "course_id": "course-1",
+        "student_id": "student-1",
+    },
+    "forum.activity": {
+        "event_type": "forum.activity",
+        "course_id": "course-1",
+        "student_id": "student-1",
+        "post_id": "post-1",
+        "post_text": "¿Alguien sabe si el parcial incluye grafos?" * 3,
+        "post_created_at": "2025-06-01T10:00:00",
+    },
+    "submission.corrected": {
+        "event_type": "submission.corrected",
+        "course_id": "course-1",
+        "assignment_id": "assignment-1",
+        "submission_id": "submission-1",
+        "student_id": "student-1",
+        "score": 8.5,
+        "feedback": "Correcto",
+        "correction_type": "automatic",
+        "needs_manual_review": False,
+        "corrected_at": "2025-06-01T10:00:00",
+    },
+}
+
+
+def sample_body(event_type: str) -> bytes:
+    return json.dumps(SAMPLE_EVENTS[event_type]).encode()
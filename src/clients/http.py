@@ -0,0 +1,169 @@
+import os
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+import httpx
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from src.utils.logger import setup_logger
+from src.utils.resilience import CircuitOpenError, protect
+from src.utils.tracing import inject_context, tracer
+
+logger = setup_logger(__name__)
+
+
+@dataclass(frozen=True)
+class UpstreamConfig:
+    base_url: str
+    timeout: float = 5.0
+    retries: int = 2
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = True
+    # Custom transport, e.g. httpx.MockTransport when testing against a stub
+    transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+def _config_from_env(prefix: str, default_url: str) -> UpstreamConfig:
+    """
+    Build an upstream configuration from <PREFIX>_URL, <PREFIX>_TIMEOUT,
+    <PREFIX>_RETRIES, <PREFIX>_MAX_CONNECTIONS, <PREFIX>_MAX_KEEPALIVE and
+    <PREFIX>_HTTP2 environment variables.
+    """
+    return UpstreamConfig(
+        base_url=os.getenv(f"{prefix}_URL", default_url),
+        timeout=float(os.getenv(f"{prefix}_TIMEOUT", "5")),
+        retries=int(os.getenv(f"{prefix}_RETRIES", "2")),
+        max_connections=int(os.getenv(f"{prefix}_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv(f"{prefix}_MAX_KEEPALIVE", "20")),
+        http2=os.getenv(f"{prefix}_HTTP2", "true").lower() == "true",
+    )
+
+
+UPSTREAMS: Dict[str, UpstreamConfig] = {
+    "courses": _config_from_env(
+        "COURSES_SERVICE", "https://courses-service-production.up.railway.app"
+    ),
+    "users": _config_from_env(
+        "USERS_SERVICE", "https://users-service-production-968d.up.railway.app"
+    ),
+    "gateway": _config_from_env(
+        "GATEWAY", "https://class-connect-main-95f2455.zuplo.app"
+    ),
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def configure_upstream(name: str, **overrides) -> UpstreamConfig:
+    """
+    Override the configuration of an upstream, e.g. to point it at a local stub.
+    A client already created for it is discarded, so call close_clients()
+    first if it is in use.
+    """
+    config = replace(UPSTREAMS[name], **overrides)
+    UPSTREAMS[name] = config
+    _clients.pop(name, None)
+    return config
+
+
+class _TracedTransport(httpx.AsyncBaseTransport):
+    """Wraps a transport with one client span per request and propagates the trace."""
+
+    def __init__(self, name: str, transport: httpx.AsyncBaseTransport):
+        self.name = name
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with tracer.start_as_current_span(
+            f"{request.method} {self.name}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "upstream": self.name,
+                "http.request.method": request.method,
+                "url.path": request.url.path,
+            },
+        ) as span:
+            inject_context(request.headers)
+            response = await self.transport.handle_async_request(request)
+            span.set_attribute("http.response.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.set_status(Status(StatusCode.ERROR))
+            return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class _ResilientTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps a transport with the rate limit and circuit breaker of its upstream.
+    Network errors, 429 and 5xx responses count as failures.
+    """
+
+    def __init__(self, name: str, transport: httpx.AsyncBaseTransport):
+        self.name = name
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async with protect(
+            self.name, is_failure=lambda e: isinstance(e, httpx.TransportError)
+        ) as call:
+            response = await self.transport.handle_async_request(request)
+            if response.status_code == 429 or response.status_code >= 500:
+                call.mark_failed()
+            return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def _build_client(name: str, config: UpstreamConfig) -> httpx.AsyncClient:
+    transport = config.transport or httpx.AsyncHTTPTransport(
+        http2=config.http2,
+        retries=config.retries,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+    )
+    return httpx.AsyncClient(
+        base_url=config.base_url,
+        timeout=config.timeout,
+        transport=_TracedTransport(name, _ResilientTransport(name, transport)),
+    )
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """
+    Get the shared client for an upstream ("courses", "users" or "gateway").
+    Clients are created on first use and keep their connections alive
+    across events for the lifetime of the process.
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build_client(name, UPSTREAMS[name])
+    return client
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Whether a failed request is worth retrying later (network error, 429, 5xx
+    or an open circuit breaker).
+    """
+    if isinstance(error, (httpx.TransportError, CircuitOpenError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+async def close_clients() -> None:
+    """Close every pooled client and its connections."""
+    for name, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error("Error closing %s client: %s", name, e)
+    _clients.clear()
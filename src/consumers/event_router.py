@@ -1,11 +1,28 @@
 import json
 import os
-import pika
-from src.database.db import get_db
+import uuid
+from aio_pika.abc import AbstractExchange, AbstractIncomingMessage
+from opentelemetry.trace import SpanKind
+from pydantic import ValidationError
+from typing import Awaitable, Callable, List, Optional
+from src.clients.http import close_clients
+from src.consumers.registry import EventRegistry, UnknownEventTypeError, registry
+from src.database.db import SessionLocal
+from src.notifications.email import smtp_pool
 from src.rabbitmq.connection import get_rabbitmq_connection
-from src.schemas.base_event import BaseEvent
+from src.rabbitmq.publisher import configure_publisher
+from src.rabbitmq.topology import (
+    EVENT_LANES,
+    EVENTS_DEFAULT_LANE,
+    Lane,
+    copy_message,
+    declare_lane_queue,
+    declare_notifications_exchange,
+    get_retry_count,
+    lane_queue_name,
+    schedule_retry,
+)
 from src.schemas.assignment_event import (
-    AssignmentEvent,
     AssignmentReminder,
     AssignmentCreated,
 )
@@ -23,10 +40,12 @@ from src.schemas.enrollment_event import (
 from src.schemas.forum_event import (
     ForumActivityEvent,
 )
+from src.schemas.fanout_event import FanoutChunk
 from src.schemas.submission_event import (
     SubmissionCorrectedEvent,
 )
 from src.handlers.send_notifications import (
+    send_notification_chunk,
     send_notifications,
 )
 from src.handlers.send_teacher_notifications import (
@@ -44,83 +63,285 @@ from src.handlers.send_forum_notifications import (
 from src.handlers.send_submission_notifications import (
     send_submission_notifications,
 )
+from src.utils.context import (
+    event_context,
+    event_id_var,
+    lane_context,
+    set_event_type,
+)
 from src.utils.logger import setup_logger
+from src.utils.metrics import (
+    DECODE_DURATION,
+    EVENT_DURATION,
+    EVENTS_IN_FLIGHT,
+    EVENTS_PROCESSED,
+)
+from src.utils.tracing import extract_context, tracer
 import asyncio
 
 logger = setup_logger(__name__)
 
+registry.register(AssignmentCreated, send_notifications)
+registry.register(AssignmentReminder, send_notifications)
+registry.register(AuxTeacherAddedEvent, send_teacher_notifications)
+registry.register(AuxTeacherRemovedEvent, send_teacher_notifications)
+registry.register(FeedbackCreatedEvent, send_feedback_notifications)
+registry.register(EnrolledStudentToCourseEvent, send_enrollment_notifications)
+registry.register(UnenrolledStudentFromCourseEvent, send_enrollment_notifications)
+registry.register(ForumActivityEvent, send_forum_notifications)
+registry.register(SubmissionCorrectedEvent, send_submission_notifications)
+registry.register(FanoutChunk, send_notification_chunk)
+
+# Deliveries of the legacy queue being moved to the lanes at the same time
+EVENTS_RELAY_CONCURRENCY = int(os.getenv("EVENTS_RELAY_CONCURRENCY", "10"))
+
+
+def get_event_id(message: AbstractIncomingMessage) -> str:
+    """
+    Id of the event carried by a delivery: its message id. Messages moved from
+    the legacy queue and retries always have one; a message published without
+    one gets a new id, so two deliveries never share it.
+    """
+    return message.message_id or uuid.uuid4().hex
+
+
+class QueueConsumer:
+    """
+    Consumes one queue on its own channel, processing at most
+    `max_concurrency` deliveries at a time with `process`.
+    """
+
+    def __init__(
+        self,
+        queue_name: str,
+        process: Callable[["QueueConsumer", AbstractIncomingMessage], Awaitable[None]],
+        max_concurrency: int,
+        prefetch_count: int,
+        lane: Optional[str] = None,
+    ):
+        self.queue_name = queue_name
+        self.process = process
+        self.lane = lane
+        self.prefetch_count = prefetch_count
+        self.channel = None
+        self.queue = None
+        # Bounds how many deliveries are handled at the same time on the loop
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self._queue_iter = None
+
+    async def open_channel(self, connection) -> None:
+        self.channel = await connection.channel()
+        await self.channel.set_qos(prefetch_count=self.prefetch_count)
+
+    async def _run(self, message: AbstractIncomingMessage) -> None:
+        try:
+            with lane_context(self.lane):
+                await self.process(self, message)
+        finally:
+            self._semaphore.release()
+
+    async def consume(self) -> None:
+        """Process deliveries until stop() is called and the in-flight ones finished."""
+        self._queue_iter = self.queue.iterator()
+        logger.info("Esperando eventos en cola: %s", self.queue_name)
+        async with self._queue_iter as queue_iter:
+            async for message in queue_iter:
+                # Wait for a free slot before taking the next delivery
+                await self._semaphore.acquire()
+                task = asyncio.create_task(self._run(message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+        if self._tasks:
+            logger.info(
+                "Waiting for %s in-flight events of %s",
+                len(self._tasks),
+                self.queue_name,
+            )
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def stop(self) -> None:
+        if self._queue_iter is not None:
+            await self._queue_iter.close()
+
 
 class EventRouter:
-    def __init__(self):
-        self.connection = get_rabbitmq_connection()
-        self.channel = self.connection.channel()
+    """
+    Consumes every lane of the notifications exchange, each with its own
+    queue and concurrency budget. Messages still published to the legacy
+    queue (NOTIFICATIONS_QUEUE_NAME) are moved onto the exchange.
+    """
+
+    def __init__(
+        self,
+        lanes: Optional[List[Lane]] = None,
+        event_registry: EventRegistry = registry,
+        default_lane: str = EVENTS_DEFAULT_LANE,
+    ):
+        self.registry = event_registry
+        self.connection = None
+        self.exchange: Optional[AbstractExchange] = None
         self.queue_name = os.getenv("NOTIFICATIONS_QUEUE_NAME")
-        self.channel.queue_declare(queue=self.queue_name)
-
-    def _get_event_class(self, event_type: str):
-        """Get the appropriate event class based on event type."""
-        event_map = {
-            "assignment.created": AssignmentCreated,
-            "assignment.reminder": AssignmentReminder,
-            "aux_teacher.added": AuxTeacherAddedEvent,
-            "aux_teacher.removed": AuxTeacherRemovedEvent,
-            "feedback.created": FeedbackCreatedEvent,
-            "student.enrolled": EnrolledStudentToCourseEvent,
-            "student.unenrolled": UnenrolledStudentFromCourseEvent,
-            "forum.activity": ForumActivityEvent,
-            "submission.corrected": SubmissionCorrectedEvent,
-        }
-        return event_map.get(event_type)
-
-    def _get_event_handler(self, event_type: str):
-        """Get the appropriate handler function based on event type."""
-        handler_map = {
-            "assignment.created": send_notifications,
-            "assignment.reminder": send_notifications,
-            "aux_teacher.added": send_teacher_notifications,
-            "aux_teacher.removed": send_teacher_notifications,
-            "feedback.created": send_feedback_notifications,
-            "student.enrolled": send_enrollment_notifications,
-            "student.unenrolled": send_enrollment_notifications,
-            "forum.activity": send_forum_notifications,
-            "submission.corrected": send_submission_notifications,
-        }
-        return handler_map.get(event_type)
-
-    def _callback(self, ch, method, properties, body):
-        try:
-            # First try to parse as BaseEvent to get the event type
-            base_event = BaseEvent.model_validate_json(body)
-            event_type = base_event.event_type
+        self.lanes = lanes if lanes is not None else EVENT_LANES
+        self.default_lane = default_lane
+        self.relay = QueueConsumer(
+            self.queue_name,
+            self._relay,
+            EVENTS_RELAY_CONCURRENCY,
+            EVENTS_RELAY_CONCURRENCY,
+        )
+        self.consumers = [
+            QueueConsumer(
+                lane_queue_name(self.queue_name, lane.name),
+                self._process,
+                lane.max_concurrency,
+                lane.prefetch_count,
+                lane.name,
+            )
+            for lane in self.lanes
+        ]
 
-            # Get the appropriate event class and handler
-            event_class = self._get_event_class(event_type)
-            handler = self._get_event_handler(event_type)
+    async def connect(self):
+        """Open the broker connection and declare the exchange, lanes and legacy queue."""
+        self.connection = await get_rabbitmq_connection()
+        await self.relay.open_channel(self.connection)
+        self.exchange = await declare_notifications_exchange(self.relay.channel)
+        # Handlers publish follow-up events, e.g. fan-out chunks, on it too
+        configure_publisher(self.exchange)
+        for lane, consumer in zip(self.lanes, self.consumers):
+            await consumer.open_channel(self.connection)
+            consumer.queue = await declare_lane_queue(
+                consumer.channel,
+                self.queue_name,
+                lane,
+                default=lane.name == self.default_lane,
+            )
+        self.relay.queue = await self.relay.channel.declare_queue(self.queue_name)
+
+    async def _relay(self, consumer: QueueConsumer, message: AbstractIncomingMessage):
+        """Move a delivery of the legacy queue onto the exchange, routed by its event type."""
+        try:
+            event_type = json.loads(message.body).get("event_type")
+        except (ValueError, AttributeError):
+            event_type = None
+        # Unknown and malformed messages end up in the default lane
+        routing_key = event_type if isinstance(event_type, str) else ""
+        try:
+            await self.exchange.publish(copy_message(message), routing_key=routing_key)
+            await message.ack()
+        except Exception as e:
+            logger.error("Could not move message to the exchange, requeueing: %s", e)
+            await message.nack(requeue=True)
 
-            if not event_class or not handler:
-                logger.warning(f"Event type {event_type} not recognized")
+    async def _callback(
+        self, consumer: QueueConsumer, message: AbstractIncomingMessage
+    ):
+        # One root span per delivery, joined to the publisher's trace if the
+        # message carries one
+        with tracer.start_as_current_span(
+            "process event",
+            context=extract_context(message.headers),
+            kind=SpanKind.CONSUMER,
+            attributes={
+                "messaging.system": "rabbitmq",
+                "messaging.destination.name": consumer.queue_name,
+                "messaging.message.id": message.message_id or "",
+                "messaging.rabbitmq.retry_count": get_retry_count(message),
+            },
+        ) as span:
+            # Decode straight into the concrete event class
+            try:
+                with DECODE_DURATION.time():
+                    event = self.registry.decode(message.body)
+            except UnknownEventTypeError as e:
+                logger.warning(str(e))
+                EVENTS_PROCESSED.labels(str(e.event_type), "unrecognized").inc()
+                span.set_attribute("event.type", str(e.event_type))
                 return
+            except ValidationError:
+                EVENTS_PROCESSED.labels("unknown", "malformed").inc()
+                raise
+
+            event_type = event.event_type
+            handler = self.registry.get_handler(event_type)
+            set_event_type(event_type)
+            span.update_name(f"process {event_type}")
+            span.set_attribute("event.type", event_type)
 
-            # Parse the full event
-            event = event_class.model_validate_json(body)
+            # One session per event; handlers never share it between tasks
+            async with SessionLocal() as db:
+                try:
+                    logger.info("Evento recibido: %s", event_type)
+                    with EVENT_DURATION.labels(event_type).time():
+                        await handler(db, event)
+                    EVENTS_PROCESSED.labels(event_type, "ok").inc()
+                except Exception:
+                    EVENTS_PROCESSED.labels(event_type, "failed").inc()
+                    raise
 
-            # Get database session
-            db = next(get_db())
+    async def _process(self, consumer: QueueConsumer, message: AbstractIncomingMessage):
+        """Handle a delivery and acknowledge it only once the handler finished."""
+        EVENTS_IN_FLIGHT.inc()
+        # Everything logged for this delivery carries its event id, which also
+        # keys the send-log of its notifications
+        with event_context(get_event_id(message)):
             try:
-                logger.info(f"Evento recibido: {event_type}")
-                asyncio.run(handler(db, event))
+                await self._callback(consumer, message)
+                await message.ack()
+            except ValidationError as e:
+                logger.error("Malformed message: %s", e)
+                await self._schedule_retry(consumer, message, e, dead_letter=True)
+            except Exception as e:
+                logger.error("Error processing message: %s", e)
+                await self._schedule_retry(consumer, message, e)
             finally:
-                db.close()
+                EVENTS_IN_FLIGHT.dec()
 
+    async def _schedule_retry(
+        self,
+        consumer: QueueConsumer,
+        message: AbstractIncomingMessage,
+        error: Exception,
+        dead_letter=False,
+    ):
+        """Move a failed message to its lane's retry queue (or DLQ) and ack it."""
+        try:
+            target = await schedule_retry(
+                consumer.channel,
+                consumer.queue_name,
+                message,
+                error,
+                dead_letter=dead_letter,
+                message_id=event_id_var.get(),
+            )
+            logger.warning("Message moved to %s", target)
+            await message.ack()
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
-
-    def start(self):
-        """Start consuming messages."""
-        self.channel.basic_consume(
-            queue=self.queue_name,
-            on_message_callback=self._callback,
-            auto_ack=True,
-        )
-        logger.info(f"Esperando eventos en cola: {self.queue_name}")
-        self.channel.start_consuming()
+            logger.error("Could not schedule retry, requeueing message: %s", e)
+            await message.nack(requeue=True)
+
+    async def start(self):
+        """
+        Start consuming every lane and the legacy queue on the running event loop.
+        Returns after stop() was called and every in-flight event finished.
+        """
+        await self.connect()
+        try:
+            await asyncio.gather(
+                self.relay.consume(),
+                *(consumer.consume() for consumer in self.consumers),
+            )
+        finally:
+            await close_clients()
+            await smtp_pool.close()
+            await self.connection.close()
+
+    async def stop(self):
+        """
+        Stop taking new deliveries. Prefetched messages that were not started
+        are returned to their queue; start() returns once in-flight events finish.
+        """
+        logger.info("Stopping consumer")
+        for consumer in (self.relay, *self.consumers):
+            await consumer.stop()
@@ -0,0 +1,74 @@
+from typing import Annotated, Any, Awaitable, Callable, Dict, Optional, Type, Union
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+EventHandler = Callable[[Any, BaseModel], Awaitable[None]]
+
+
+class UnknownEventTypeError(Exception):
+    def __init__(self, event_type: Any):
+        super().__init__(f"Event type {event_type} not recognized")
+        self.event_type = event_type
+
+
+class EventRegistry:
+    """
+    Maps event types to their event class and handler.
+
+    Messages are decoded in a single pass with a pydantic discriminated union
+    on event_type. The TypeAdapter is compiled once and only rebuilt when a
+    new event type is registered.
+    """
+
+    def __init__(self):
+        self._classes: Dict[str, Type[BaseModel]] = {}
+        self._handlers: Dict[str, EventHandler] = {}
+        self._adapter: Optional[TypeAdapter] = None
+
+    def register(self, event_class: Type[BaseModel], handler: EventHandler) -> None:
+        """
+        Register an event class and its handler. The class must declare
+        event_type as a Literal with the type as default.
+        """
+        event_type = event_class.model_fields["event_type"].default
+        self._classes[event_type] = event_class
+        self._handlers[event_type] = handler
+        self._adapter = None
+
+    def get_event_class(self, event_type: str) -> Optional[Type[BaseModel]]:
+        return self._classes.get(event_type)
+
+    def get_handler(self, event_type: str) -> Optional[EventHandler]:
+        return self._handlers.get(event_type)
+
+    @property
+    def event_types(self) -> list[str]:
+        return list(self._classes)
+
+    def _build_adapter(self) -> TypeAdapter:
+        classes = tuple(self._classes.values())
+        if len(classes) == 1:
+            return TypeAdapter(classes[0])
+        return TypeAdapter(Annotated[Union[classes], Field(discriminator="event_type")])
+
+    def decode(self, body: Union[str, bytes]) -> BaseModel:
+        """
+        Decode a message body into its concrete event class.
+
+        Raises:
+            UnknownEventTypeError: If event_type has no registered class
+            ValidationError: If the body is not a valid event
+        """
+        if self._adapter is None:
+            self._adapter = self._build_adapter()
+        try:
+            return self._adapter.validate_json(body)
+        except ValidationError as e:
+            for error in e.errors():
+                if error["type"] == "union_tag_invalid":
+                    raise UnknownEventTypeError(error["ctx"]["tag"]) from None
+            raise
+
+
+# Registry used by the EventRouter, built when the router module is imported.
+# Other modules can add their own event types with registry.register(...)
+registry = EventRegistry()
@@ -1,19 +1,101 @@
-from sqlalchemy import create_engine
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Connections kept open per worker process, plus extra ones allowed under load
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds after which a connection is replaced, below the server idle timeout
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Seconds to wait for a free connection before failing the event
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sync URLs in DATABASE_URL are switched to the matching async driver
+_ASYNC_DRIVERNAMES = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _async_url(url: str):
+    url = make_url(url)
+    drivername = _ASYNC_DRIVERNAMES.get(url.drivername)
+    return url.set(drivername=drivername) if drivername else url
+
+
+def _pool_options(url) -> dict:
+    if url.get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    }
+
+
+_url = _async_url(DATABASE_URL)
+engine = create_async_engine(_url, **_pool_options(_url))
+SessionLocal = async_sessionmaker(
+    engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+# INSERT ... ON CONFLICT DO NOTHING of each supported backend
+_INSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def insert_ignoring_conflicts(db: AsyncSession, model):
+    """An INSERT into the model's table that skips rows already present."""
+    insert = _INSERT_DIALECTS[db.get_bind().dialect.name]
+    return insert(model).on_conflict_do_nothing()
+
+
+async def create_tables(*models) -> None:
+    """Create the tables of the given models if they do not exist yet."""
+    tables = [model.__table__ for model in models]
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all, tables=tables)
+
+
+async def add_missing_columns(model, *names: str) -> None:
+    """
+    Add the given columns of the model to its table when the table exists
+    without them, for tables this service reads but does not create.
+    """
+    table = model.__table__
+
+    def add(connection) -> None:
+        inspector = inspect(connection)
+        if not inspector.has_table(table.name):
+            return
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        # Another deployment may be adding it at the same time
+        if_not_exists = (
+            "IF NOT EXISTS " if connection.dialect.name == "postgresql" else ""
+        )
+        for name in names:
+            if name in existing:
+                continue
+            column = CreateColumn(table.c[name]).compile(dialect=connection.dialect)
+            connection.execute(
+                text(f"ALTER TABLE {table.name} ADD COLUMN {if_not_exists}{column}")
+            )
+
+    async with engine.begin() as connection:
+        await connection.run_sync(add)
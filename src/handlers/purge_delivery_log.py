@@ -0,0 +1,35 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from src.database.db import SessionLocal
+from src.repository.notification_deliveries import delete_deliveries_before
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Days the send-log keeps deliveries, longer than any event can be retried
+DELIVERY_LOG_RETENTION_DAYS = float(os.getenv("DELIVERY_LOG_RETENTION_DAYS", "30"))
+DELIVERY_LOG_PURGE_INTERVAL_SECONDS = float(
+    os.getenv("DELIVERY_LOG_PURGE_INTERVAL_SECONDS", "3600")
+)
+
+
+async def purge_delivery_log() -> int:
+    """Delete deliveries older than the retention. Returns how many were deleted."""
+    async with SessionLocal() as db:
+        before = datetime.now(timezone.utc) - timedelta(
+            days=DELIVERY_LOG_RETENTION_DAYS
+        )
+        return await delete_deliveries_before(db, before)
+
+
+async def run_delivery_log_purger() -> None:
+    """Periodically delete the deliveries past their retention."""
+    while True:
+        await asyncio.sleep(DELIVERY_LOG_PURGE_INTERVAL_SECONDS)
+        try:
+            deleted = await purge_delivery_log()
+            if deleted:
+                logger.info("Purged %s old notification deliveries", deleted)
+        except Exception as e:
+            logger.error("Error purging notification deliveries: %s", e)
@@ -0,0 +1,73 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List
+from src.database.db import SessionLocal
+from src.handlers.send_forum_notifications import fetch_forum_participants
+from src.handlers.send_notifications import fetch_course_enrollments
+from src.model.course_roster import RosterKind
+from src.repository.course_rosters import claim_stale_rosters, replace_roster
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# How often cached rosters are checked against the courses service
+ROSTER_RECONCILE_INTERVAL_SECONDS = float(
+    os.getenv("ROSTER_RECONCILE_INTERVAL_SECONDS", "900")
+)
+# Rosters synced longer ago than this are refreshed
+ROSTER_MAX_AGE_SECONDS = float(os.getenv("ROSTER_MAX_AGE_SECONDS", "3600"))
+ROSTER_RECONCILE_BATCH_SIZE = int(os.getenv("ROSTER_RECONCILE_BATCH_SIZE", "50"))
+
+
+async def fetch_roster(course_id: str, kind: str) -> List[str]:
+    """
+    Fetch the members of a roster, raising on any failure so a cached roster
+    is never replaced by the empty result of a failed request.
+    """
+    if kind == RosterKind.FORUM:
+        return await fetch_forum_participants(course_id)
+    enrollments = await fetch_course_enrollments(course_id)
+    return [enrollment["student_id"] for enrollment in enrollments]
+
+
+async def reconcile_rosters() -> int:
+    """
+    Refresh stale rosters from the courses service. Rosters are claimed with
+    FOR UPDATE SKIP LOCKED so workers split the work. Returns how many were refreshed.
+    """
+    async with SessionLocal() as db:
+        synced_before = datetime.now(timezone.utc) - timedelta(
+            seconds=ROSTER_MAX_AGE_SECONDS
+        )
+        stale = await claim_stale_rosters(
+            db, synced_before, ROSTER_RECONCILE_BATCH_SIZE
+        )
+        refreshed = 0
+        for roster in stale:
+            try:
+                user_ids = await fetch_roster(roster.course_id, roster.kind)
+            except Exception as e:
+                logger.error(
+                    "Could not reconcile %s roster of course %s: %s",
+                    roster.kind,
+                    roster.course_id,
+                    e,
+                )
+                continue
+            await replace_roster(db, roster.course_id, roster.kind, user_ids)
+            refreshed += 1
+        await db.commit()
+        return refreshed
+
+
+async def run_roster_reconciler() -> None:
+    """Periodically reconcile the local rosters with the courses service."""
+    while True:
+        await asyncio.sleep(ROSTER_RECONCILE_INTERVAL_SECONDS)
+        try:
+            refreshed = await reconcile_rosters()
+            if refreshed:
+                logger.info("Reconciled %s course rosters", refreshed)
+        except Exception as e:
+            logger.error("Error reconciling course rosters: %s", e)
@@ -0,0 +1,125 @@
+import asyncio
+import html
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+from src.database.db import SessionLocal
+from src.model.notification_preferences import DigestFrequency
+from src.model.pending_notification import PendingNotification
+from src.notifications.email import send_rendered_email
+from src.notifications.templates import RenderedEmail, SafeHtml, get_template
+from src.repository.pending_notifications import (
+    claim_pending_notifications,
+    delete_pending_notifications,
+)
+from src.utils.fanout import NotificationOutcome, fan_out, limit
+from src.utils.helper_functions import get_user_email
+from src.utils.logger import setup_logger
+from src.utils.result import Success
+
+logger = setup_logger(__name__)
+
+# UTC hour at which daily digests are sent
+DIGEST_DAILY_HOUR = int(os.getenv("DIGEST_DAILY_HOUR", "8"))
+# Users whose pending notifications are claimed from the database at a time
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "1000"))
+
+
+def build_digest_email(notifications: List[PendingNotification]) -> RenderedEmail:
+    """Combine a user's pending notifications into a single email."""
+    sections = [(n.subject, n.content.strip()) for n in notifications]
+    return get_template("notifications.digest").render(
+        {
+            "count": len(notifications),
+            "sections": "\n\n".join(
+                f"{subject}\n{content}" for subject, content in sections
+            ),
+            "sections_html": SafeHtml(
+                "".join(
+                    f"<h3>{html.escape(subject)}</h3>"
+                    f"<p>{'<br>'.join(map(html.escape, content.splitlines()))}</p>"
+                    for subject, content in sections
+                )
+            ),
+        }
+    )
+
+
+async def send_user_digest(uid: str, notifications: List[PendingNotification]) -> bool:
+    """Send one digest email. Returns False if it should be retried next period."""
+    user_email = await get_user_email(uid)
+    if not user_email:
+        logger.warning(
+            "No email for user %s, dropping %s digest entries", uid, len(notifications)
+        )
+        return True
+
+    async with limit("email"):
+        result = await send_rendered_email(
+            user_email, build_digest_email(notifications)
+        )
+    return isinstance(result, Success)
+
+
+async def send_digests(frequency: str) -> None:
+    """
+    Send one aggregated email per user with pending notifications of the given
+    frequency, then delete the sent rows in bulk. Users are claimed with
+    FOR UPDATE SKIP LOCKED so several workers never send the same digest, and
+    each user is visited once per run, failed digests wait for the next one.
+    """
+    # Notifications queued while the run goes on belong to the next digest
+    started_at = datetime.now(timezone.utc)
+    last_uid = ""
+    async with SessionLocal() as db:
+        while True:
+            pending = await claim_pending_notifications(
+                db, frequency, started_at, last_uid, DIGEST_BATCH_SIZE
+            )
+            if not pending:
+                await db.commit()
+                break
+
+            by_user: Dict[str, List[PendingNotification]] = defaultdict(list)
+            for notification in pending:
+                by_user[notification.uid].append(notification)
+            last_uid = pending[-1].uid
+
+            sent_ids: List[int] = []
+
+            async def send(uid: str) -> NotificationOutcome:
+                if not await send_user_digest(uid, by_user[uid]):
+                    return NotificationOutcome.FAILED
+                sent_ids.extend(n.id for n in by_user[uid])
+                return NotificationOutcome.SENT
+
+            summary = await fan_out(
+                list(by_user), send, event_type=f"digest.{frequency}"
+            )
+            await delete_pending_notifications(db, sent_ids)
+            await db.commit()
+            logger.info("Sent %s digests: %s", frequency, summary)
+
+            # Stop when everything left was claimed already
+            if len(by_user) < DIGEST_BATCH_SIZE:
+                break
+
+
+async def run_digest_scheduler() -> None:
+    """Send hourly digests at the top of every hour and daily ones at DIGEST_DAILY_HOUR."""
+    while True:
+        now = datetime.now(timezone.utc)
+        next_hour = (now + timedelta(hours=1)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        await asyncio.sleep((next_hour - now).total_seconds())
+
+        frequencies = [DigestFrequency.HOURLY]
+        if next_hour.hour == DIGEST_DAILY_HOUR:
+            frequencies.append(DigestFrequency.DAILY)
+        for frequency in frequencies:
+            try:
+                await send_digests(frequency)
+            except Exception as e:
+                logger.error("Error sending %s digests: %s", frequency, e)
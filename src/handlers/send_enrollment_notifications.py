@@ -1,20 +1,49 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.utils.logger import setup_logger
 from src.schemas.enrollment_event import (
     EnrolledStudentToCourseEvent,
     UnenrolledStudentFromCourseEvent,
 )
+from src.model.course_roster import RosterKind
+from src.repository.course_rosters import (
+    ROSTER_CACHE_ENABLED,
+    add_roster_member,
+    remove_roster_member,
+)
+from src.notifications.delivery_log import DeliveryLog
 from src.utils.helper_functions import send_notifications_based_on_preferences
 
 logger = setup_logger(__name__)
 
 
 async def send_enrollment_notifications(
-    db: Session, event: EnrolledStudentToCourseEvent | UnenrolledStudentFromCourseEvent
+    db: AsyncSession,
+    event: EnrolledStudentToCourseEvent | UnenrolledStudentFromCourseEvent,
 ) -> None:
     """Main function to handle enrollment notification sending."""
-    logger.info(f"Enrollment event received: '{event}'")
+    logger.info("Enrollment event received: '%s'", event)
+
+    # Keep the local course roster in sync
+    if ROSTER_CACHE_ENABLED:
+        if isinstance(event, EnrolledStudentToCourseEvent):
+            await add_roster_member(
+                db, event.course_id, RosterKind.ENROLLMENTS, event.student_id
+            )
+        else:
+            await remove_roster_member(
+                db, event.course_id, RosterKind.ENROLLMENTS, event.student_id
+            )
 
-    await send_notifications_based_on_preferences(
-        event.student_id, event, email_enabled=True, push_enabled=True
-    )
+    delivery_log = DeliveryLog(db, event)
+    await delivery_log.load([event.student_id])
+    try:
+        await send_notifications_based_on_preferences(
+            event.student_id,
+            event,
+            email_enabled=True,
+            push_enabled=True,
+            delivery_log=delivery_log,
+        )
+    finally:
+        # Recorded even when a transient failure retries the event
+        await delivery_log.flush()
@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.utils.logger import setup_logger
 from src.schemas.feedback_event import FeedbackCreatedEvent
 from src.utils.helper_functions import process_user_notification
@@ -6,8 +6,10 @@ from src.utils.helper_functions import process_user_notification
 logger = setup_logger(__name__)
 
 
-async def send_feedback_notifications(db: Session, event: FeedbackCreatedEvent) -> None:
+async def send_feedback_notifications(
+    db: AsyncSession, event: FeedbackCreatedEvent
+) -> None:
     """Main function to handle feedback notification sending."""
-    logger.info(f"Feedback event received: '{event}'")
+    logger.info("Feedback event received: '%s'", event)
 
     await process_user_notification(event.student_id, event, db)
@@ -1,52 +1,237 @@
-import httpx
-from typing import List
-from sqlalchemy.orm import Session
+import asyncio
+import hashlib
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.clients.http import get_client, is_transient
+from src.database.db import SessionLocal
+from src.model.course_roster import RosterKind
+from src.model.pending_forum_post import PendingForumPost
+from src.repository.course_rosters import (
+    ROSTER_CACHE_ENABLED,
+    add_roster_member,
+    get_roster,
+    save_roster,
+)
+from src.repository.notifications_preferences import get_preferences_by_user_ids
+from src.repository.pending_forum_posts import (
+    add_pending_forum_post,
+    claim_pending_forum_posts,
+    delete_pending_forum_posts,
+)
+from src.notifications.delivery_log import DeliveryLog
+from src.notifications.digest import DigestBuffer
+from src.notifications.push import PushDispatcher
 from src.utils.logger import setup_logger
-from src.schemas.forum_event import ForumActivityEvent
-from src.utils.helper_functions import process_user_notification
+from src.utils.metrics import UPSTREAM_REQUEST_DURATION
+from src.schemas.forum_event import ForumActivityDigest, ForumActivityEvent
+from src.utils.fanout import fan_out, limit
+from src.utils.helper_functions import (
+    flush_fan_out,
+    notify_with_preference,
+    raise_transient_failure,
+)
 
 logger = setup_logger(__name__)
 
+# Seconds forum events of a course are buffered before one digest is sent, 0 disables it
+FORUM_COALESCE_WINDOW_SECONDS = float(os.getenv("FORUM_COALESCE_WINDOW_SECONDS", "30"))
+# How often pending forum posts are checked for digests to send
+FORUM_DIGEST_POLL_SECONDS = float(os.getenv("FORUM_DIGEST_POLL_SECONDS", "5"))
+# Courses whose digest is claimed from the database at a time
+FORUM_DIGEST_BATCH_SIZE = int(os.getenv("FORUM_DIGEST_BATCH_SIZE", "20"))
 
-async def get_forum_participants(course_id: str) -> List[str]:
-    """Fetch list of user IDs who have participated in the forum."""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://courses-service-production.up.railway.app/forum/courses/{course_id}/participants"
+
+async def fetch_forum_participants(course_id: str) -> List[str]:
+    """
+    Fetch list of user IDs who have participated in the forum, raising on any
+    failure, including a response without a list of participants.
+    """
+    async with limit("courses"):
+        with UPSTREAM_REQUEST_DURATION.labels("courses", "forum_participants").time():
+            response = await get_client("courses").get(
+                f"/forum/courses/{course_id}/participants"
             )
-            response.raise_for_status()
-            response_data = response.json()
+    response.raise_for_status()
+    response_data = response.json()
+    participants = (
+        response_data.get("participants") if isinstance(response_data, dict) else None
+    )
+    if not isinstance(participants, list):
+        raise ValueError(
+            f"Unexpected forum participants response for course {course_id}"
+        )
+    return list(dict.fromkeys(str(p) for p in participants if p))
 
-            if response is None:
-                logger.error("No response received from courses service")
-                return []
 
-            # Extract participants from the response structure
-            participants = response_data.get("participants", [])
+async def get_forum_participants(course_id: str) -> List[str]:
+    """
+    Fetch list of user IDs who have participated in the forum.
+    Transient failures are raised so the event is retried instead of dropped.
+    """
+    try:
+        return await fetch_forum_participants(course_id)
+    except Exception as e:
+        logger.error("Could not get forum participants for course %s: %s", course_id, e)
+        if is_transient(e):
+            raise
+        return []
+
 
-            # Ensure we return a list of strings (user IDs)
-            if isinstance(participants, list):
-                return [str(p) for p in participants if p]
+async def get_course_forum_participants(db: AsyncSession, course_id: str) -> List[str]:
+    """
+    Resolve the forum participants of a course from the local roster, fetching
+    them from the courses service only the first time.
+    """
+    if ROSTER_CACHE_ENABLED:
+        roster = await get_roster(db, course_id, RosterKind.FORUM)
+        if roster is not None:
+            return roster
 
-            return []
+    participants = await get_forum_participants(course_id)
+    if ROSTER_CACHE_ENABLED and participants:
+        await save_roster(db, course_id, RosterKind.FORUM, participants)
+    return participants
 
-    except Exception as e:
-        logger.error(f"Could not get forum participants for course {course_id}: {e}")
-        return []
 
+def get_delivery_event_id(
+    event: Union[ForumActivityEvent, ForumActivityDigest],
+) -> Optional[str]:
+    """
+    Send-log id of a forum notification. A digest is identified by its posts,
+    so it is recognised when it is sent again after a failed attempt.
+    """
+    if isinstance(event, ForumActivityEvent):
+        return None
+    post_ids = ",".join(sorted(post.post_id for post in event.posts))
+    return "forum-digest:" + hashlib.sha256(post_ids.encode()).hexdigest()
 
-async def send_forum_notifications(db: Session, event: ForumActivityEvent) -> None:
-    """Main function to handle forum notification sending."""
-    logger.info(f"Forum event received: '{event}'")
 
+async def notify_forum_participants(
+    db: AsyncSession, event: Union[ForumActivityEvent, ForumActivityDigest]
+) -> None:
+    """Send a forum event or digest once to every participant of the course forum."""
     # Get forum participants instead of all enrollments
-    participants = await get_forum_participants(event.course_id)
+    participants = await get_course_forum_participants(db, event.course_id)
 
     if not participants:
-        logger.warning(f"No forum participants found for course {event.course_id}")
+        logger.warning("No forum participants found for course %s", event.course_id)
+        return
+
+    logger.info("Starting to process %s forum participants", len(participants))
+    preferences = await get_preferences_by_user_ids(db, participants, event.event_type)
+    push_dispatcher = PushDispatcher(event)
+    digest_buffer = DigestBuffer(event)
+    delivery_log = DeliveryLog(db, event, get_delivery_event_id(event))
+    await delivery_log.load(participants)
+    summary = await fan_out(
+        participants,
+        lambda participant_id: notify_with_preference(
+            participant_id,
+            event,
+            preferences.get(participant_id),
+            push_dispatcher,
+            digest_buffer,
+            delivery_log,
+        ),
+        event_type=event.event_type,
+    )
+    await flush_fan_out(db, push_dispatcher, digest_buffer, delivery_log, summary)
+    logger.info("Finished forum.activity for course %s: %s", event.course_id, summary)
+    raise_transient_failure(summary)
+
+
+async def send_forum_digests(window: float = FORUM_COALESCE_WINDOW_SECONDS) -> int:
+    """
+    Send one digest per course whose oldest pending post arrived more than
+    `window` seconds ago, then delete its posts. Courses are claimed with
+    FOR UPDATE SKIP LOCKED, so several workers never send the same digest.
+    Returns how many digests were sent.
+    """
+    received_before = datetime.now(timezone.utc) - timedelta(seconds=window)
+    sent = 0
+    async with SessionLocal() as db:
+        while True:
+            pending = await claim_pending_forum_posts(
+                db, received_before, FORUM_DIGEST_BATCH_SIZE
+            )
+            by_course: Dict[str, List[PendingForumPost]] = defaultdict(list)
+            for post in pending:
+                by_course[post.course_id].append(post)
+
+            sent_ids: List[int] = []
+            for course_id, posts in by_course.items():
+                digest = ForumActivityDigest(
+                    course_id=course_id,
+                    posts=[
+                        ForumActivityEvent(
+                            course_id=post.course_id,
+                            student_id=post.student_id,
+                            post_id=post.post_id,
+                            post_text=post.post_text,
+                            post_created_at=post.post_created_at,
+                        )
+                        for post in posts
+                    ],
+                )
+                logger.info(
+                    "Sending forum digest of %s posts for course %s",
+                    len(posts),
+                    course_id,
+                )
+                try:
+                    # The claim's session keeps the course locked meanwhile
+                    async with SessionLocal() as notify_db:
+                        await notify_forum_participants(notify_db, digest)
+                except Exception as e:
+                    logger.error(
+                        "Could not send forum digest of course %s: %s", course_id, e
+                    )
+                    continue
+                sent_ids.extend(post.id for post in posts)
+
+            await delete_pending_forum_posts(db, sent_ids)
+            await db.commit()
+            sent += len(by_course)
+            # Stop when everything left was claimed already or keeps failing
+            if len(by_course) < FORUM_DIGEST_BATCH_SIZE or not sent_ids:
+                return sent
+
+
+async def run_forum_digest_sender() -> None:
+    """Periodically send the forum digests whose window has passed."""
+    if FORUM_COALESCE_WINDOW_SECONDS <= 0:
         return
+    while True:
+        await asyncio.sleep(FORUM_DIGEST_POLL_SECONDS)
+        try:
+            await send_forum_digests()
+        except Exception as e:
+            logger.error("Error sending forum digests: %s", e)
+
+
+async def send_forum_notifications(db: AsyncSession, event: ForumActivityEvent) -> None:
+    """Main function to handle forum notification sending."""
+    logger.info("Forum event received: '%s'", event)
+
+    # The author is a forum participant from now on
+    if ROSTER_CACHE_ENABLED:
+        await add_roster_member(db, event.course_id, RosterKind.FORUM, event.student_id)
 
-    logger.info(f"Starting to process {len(participants)} forum participants")
-    for participant_id in participants:
-        await process_user_notification(participant_id, event, db)
+    if FORUM_COALESCE_WINDOW_SECONDS > 0:
+        # Stored so the message is acked right away; the course's digest is
+        # sent by run_forum_digest_sender once the window has passed
+        await add_pending_forum_post(
+            db,
+            {
+                "course_id": event.course_id,
+                "post_id": event.post_id,
+                "student_id": event.student_id,
+                "post_text": event.post_text,
+                "post_created_at": event.post_created_at,
+            },
+        )
+    else:
+        await notify_forum_participants(db, event)
@@ -1,23 +1,38 @@
-import httpx
-from sqlalchemy.orm import Session
-from src.repository.notifications_preferences import get_preferences_by_user_id
+import asyncio
+import os
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.clients.http import get_client, is_transient
+from src.model.course_roster import RosterKind
+from src.repository.course_rosters import ROSTER_CACHE_ENABLED, get_roster, save_roster
+from src.repository.notifications_preferences import get_preferences_by_user_ids
+from src.notifications.delivery_log import DeliveryLog
+from src.notifications.digest import DigestBuffer
+from src.notifications.push import PushDispatcher
+from src.rabbitmq.publisher import publish_event
+from src.utils.context import event_id_var
 from src.utils.logger import setup_logger
-from notifications.email import send_notification_email
-from notifications.push import send_push_to_token, get_user_fcm_tokens
-from utils.result import Success
-from typing import List, Dict, Optional
+from src.utils.metrics import UPSTREAM_REQUEST_DURATION
+from src.utils.fanout import fan_out, limit
+from typing import List, Dict, Optional, Set
 from src.schemas.assignment_event import (
     AssignmentEvent,
     AssignmentReminder,
-    AssignmentCreated,
 )
+from src.schemas.fanout_event import FanoutChunk
 from src.utils.helper_functions import (
-    get_user_email,
-    process_user_notification,
+    flush_fan_out,
+    notify_with_preference,
+    raise_transient_failure,
 )
 
 logger = setup_logger(__name__)
 
+# Students whose submission status is checked at the same time for a reminder
+SUBMISSION_CHECK_CONCURRENCY = int(os.getenv("SUBMISSION_CHECK_CONCURRENCY", "20"))
+# Courses with more students are split in fanout.chunk messages of this many
+# students, shared by every worker. 0 notifies every course in one piece
+FANOUT_CHUNK_SIZE = int(os.getenv("FANOUT_CHUNK_SIZE", "0"))
+
 
 async def check_submission_status(assignment_id: str, student_id: str) -> bool:
     """
@@ -26,84 +41,226 @@ async def check_submission_status(assignment_id: str, student_id: str) -> bool:
     False otherwise.
     """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://courses-service-production.up.railway.app/students/{student_id}/submissions",
-                headers={"X-Student-UUID": student_id},
-            )
-            response.raise_for_status()
-            submissions = response.json()
-            # Find submission for this specific assignment
-            assignment_submission = next(
-                (sub for sub in submissions if sub["assignment_id"] == assignment_id),
-                None,
-            )
+        async with limit("courses"):
+            with UPSTREAM_REQUEST_DURATION.labels("courses", "submissions").time():
+                response = await get_client("courses").get(
+                    f"/students/{student_id}/submissions",
+                    headers={"X-Student-UUID": student_id},
+                )
+        response.raise_for_status()
+        submissions = response.json()
+        # Find submission for this specific assignment
+        assignment_submission = next(
+            (sub for sub in submissions if sub["assignment_id"] == assignment_id),
+            None,
+        )
 
-            if assignment_submission:
-                # Check if submission status is 'submitted' or 'late'
-                return assignment_submission["status"] in ["submitted", "late"]
+        if assignment_submission:
+            # Check if submission status is 'submitted' or 'late'
+            return assignment_submission["status"] in ["submitted", "late"]
 
-            return False
+        return False
 
     except Exception as e:
         logger.error(
-            f"Error checking submission status for student {student_id} and assignment {assignment_id}: {e}"
+            "Error checking submission status for student %s and assignment %s: %s",
+            student_id,
+            assignment_id,
+            e,
         )
         return False
 
 
-async def get_course_enrollments(course_id: str) -> List[Dict]:
-    """Fetch enrollments for a given course."""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://courses-service-production.up.railway.app/courses/{course_id}/enrollments"
+async def fetch_course_enrollments(course_id: str) -> List[Dict]:
+    """
+    Fetch enrollments for a given course, raising on any failure, including
+    a response that is not a list of enrollments.
+    """
+    async with limit("courses"):
+        with UPSTREAM_REQUEST_DURATION.labels("courses", "enrollments").time():
+            response = await get_client("courses").get(
+                f"/courses/{course_id}/enrollments"
             )
-            response.raise_for_status()
-            response_data = response.json()
+    response.raise_for_status()
+    response_data = response.json()
+    enrollments = (
+        response_data.get("data") if isinstance(response_data, dict) else response_data
+    )
+    if not isinstance(enrollments, list):
+        raise ValueError(f"Unexpected enrollments response for course {course_id}")
+    return enrollments
 
-            if response is None:
-                logger.error("No response received from courses service")
-                return []
 
-            return (
-                response_data
-                if isinstance(response_data, list)
-                else response_data.get("data", [])
-            )
+async def get_course_enrollments(course_id: str) -> List[Dict]:
+    """
+    Fetch enrollments for a given course.
+    Transient failures are raised so the event is retried instead of dropped.
+    """
+    try:
+        return await fetch_course_enrollments(course_id)
     except Exception as e:
-        logger.error(f"Could not get enrollments for course {course_id}: {e}")
+        logger.error("Could not get enrollments for course %s: %s", course_id, e)
+        if is_transient(e):
+            raise
         return []
 
 
-async def process_enrollment(
-    enrollment: Dict, event: AssignmentEvent, db: Session
-) -> None:
-    """Process a single enrollment for notifications."""
-    student_id = enrollment["student_id"]
+async def get_course_student_ids(db: AsyncSession, course_id: str) -> List[str]:
+    """
+    Resolve the students of a course from the local roster, fetching
+    the enrollments from the courses service only the first time.
+    """
+    if ROSTER_CACHE_ENABLED:
+        roster = await get_roster(db, course_id, RosterKind.ENROLLMENTS)
+        if roster is not None:
+            return roster
 
-    # For AssignmentReminder events, check if student has already submitted
-    if isinstance(event, AssignmentReminder):
-        has_submitted = await check_submission_status(event.assignment_id, student_id)
-        if has_submitted:
-            logger.info(
-                f"Student {student_id} has already submitted assignment {event.assignment_id}, skipping reminder"
-            )
-            return
+    enrollments = await get_course_enrollments(course_id)
+    student_ids = [enrollment["student_id"] for enrollment in enrollments]
+    if ROSTER_CACHE_ENABLED and student_ids:
+        await save_roster(db, course_id, RosterKind.ENROLLMENTS, student_ids)
+    return student_ids
+
+
+async def get_submitted_students(
+    assignment_id: str, student_ids: List[str]
+) -> Set[str]:
+    """
+    Return the students who already submitted the assignment.
+    Checks run concurrently, at most SUBMISSION_CHECK_CONCURRENCY at a time.
+    """
+    semaphore = asyncio.Semaphore(SUBMISSION_CHECK_CONCURRENCY)
 
-    await process_user_notification(student_id, event, db)
+    async def check(student_id: str) -> bool:
+        async with semaphore:
+            return await check_submission_status(assignment_id, student_id)
 
+    results = await asyncio.gather(*(check(student_id) for student_id in student_ids))
+    return {
+        student_id
+        for student_id, has_submitted in zip(student_ids, results)
+        if has_submitted
+    }
 
-async def send_notifications(db: Session, event: AssignmentEvent) -> None:
+
+async def send_notifications(db: AsyncSession, event: AssignmentEvent) -> None:
     """Main function to handle notification sending."""
-    logger.info(f"Event received: '{event}'")
+    logger.info("Event received: '%s'", event)
+
+    student_ids = await get_course_student_ids(db, event.course_id)
 
-    enrollments = await get_course_enrollments(event.course_id)
+    if not student_ids:
+        logger.warning("No enrollments found for course %s", event.course_id)
+        return
 
-    if not enrollments:
-        logger.warning(f"No enrollments found for course {event.course_id}")
+    if 0 < FANOUT_CHUNK_SIZE < len(student_ids):
+        await publish_chunks(event, student_ids)
         return
 
-    logger.info(f"Starting to process {len(enrollments)} enrollments")
-    for enrollment in enrollments:
-        await process_enrollment(enrollment, event, db)
+    await notify_students(db, event, student_ids)
+
+
+async def publish_chunks(
+    event: AssignmentEvent, student_ids: List[str], chunk_size: int = FANOUT_CHUNK_SIZE
+) -> None:
+    """
+    Split the students of the event in fanout.chunk messages. Chunk message
+    ids derive from the event id, and every chunk records its deliveries
+    under it, so republishing after a crash does not notify anyone twice.
+    """
+    parent_event_id = event_id_var.get()
+    chunks = [
+        student_ids[i : i + chunk_size] for i in range(0, len(student_ids), chunk_size)
+    ]
+    await asyncio.gather(
+        *(
+            publish_event(
+                FanoutChunk(
+                    parent_event_id=parent_event_id,
+                    chunk_index=index,
+                    chunk_count=len(chunks),
+                    recipients=recipients,
+                    event=event,
+                ),
+                message_id=(
+                    f"{parent_event_id}.chunk.{index}" if parent_event_id else None
+                ),
+            )
+            for index, recipients in enumerate(chunks)
+        )
+    )
+    logger.info(
+        "Split %s for course %s in %s chunks of up to %s students",
+        event.event_type,
+        event.course_id,
+        len(chunks),
+        chunk_size,
+    )
+
+
+async def send_notification_chunk(db: AsyncSession, chunk: FanoutChunk) -> None:
+    """Notify the students of one chunk of a course-wide event."""
+    logger.info(
+        "Chunk %s/%s of %s for course %s received",
+        chunk.chunk_index + 1,
+        chunk.chunk_count,
+        chunk.event.event_type,
+        chunk.event.course_id,
+    )
+    await notify_students(
+        db, chunk.event, chunk.recipients, event_id=chunk.parent_event_id
+    )
+
+
+async def notify_students(
+    db: AsyncSession,
+    event: AssignmentEvent,
+    student_ids: List[str],
+    event_id: Optional[str] = None,
+) -> None:
+    """
+    Notify the given students of the event according to their preferences.
+    The send-log is keyed by event_id, the id of the delivery being processed
+    by default.
+    """
+    logger.info("Starting to process %s enrollments", len(student_ids))
+    preferences = await get_preferences_by_user_ids(db, student_ids, event.event_type)
+
+    # For AssignmentReminder events, skip students who have already submitted.
+    # Only students that would actually be notified need to be checked.
+    submitted = set()
+    if isinstance(event, AssignmentReminder):
+        submitted = await get_submitted_students(
+            event.assignment_id, [s for s in student_ids if s in preferences]
+        )
+        if submitted:
+            logger.info(
+                "%s students have already submitted assignment %s, skipping their reminders",
+                len(submitted),
+                event.assignment_id,
+            )
+            student_ids = [s for s in student_ids if s not in submitted]
+
+    push_dispatcher = PushDispatcher(event)
+    digest_buffer = DigestBuffer(event)
+    # Recipients a previous attempt of this event reached are not sent again
+    delivery_log = DeliveryLog(db, event, event_id)
+    await delivery_log.load(student_ids)
+    summary = await fan_out(
+        student_ids,
+        lambda student_id: notify_with_preference(
+            student_id,
+            event,
+            preferences.get(student_id),
+            push_dispatcher,
+            digest_buffer,
+            delivery_log,
+        ),
+        event_type=event.event_type,
+    )
+    await flush_fan_out(db, push_dispatcher, digest_buffer, delivery_log, summary)
+    summary.skipped += len(submitted)
+    logger.info(
+        "Finished %s for course %s: %s", event.event_type, event.course_id, summary
+    )
+    raise_transient_failure(summary)
@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.utils.logger import setup_logger
 from src.schemas.submission_event import SubmissionCorrectedEvent
 from src.utils.helper_functions import process_user_notification
@@ -7,9 +7,9 @@ logger = setup_logger(__name__)
 
 
 async def send_submission_notifications(
-    db: Session, event: SubmissionCorrectedEvent
+    db: AsyncSession, event: SubmissionCorrectedEvent
 ) -> None:
     """Main function to handle submission notification sending."""
-    logger.info(f"Submission event received: '{event}'")
+    logger.info("Submission event received: '%s'", event)
 
     await process_user_notification(event.student_id, event, db)
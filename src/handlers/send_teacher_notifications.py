@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.utils.logger import setup_logger
 from src.schemas.teacher_event import (
     AuxTeacherAddedEvent,
@@ -10,9 +10,9 @@ logger = setup_logger(__name__)
 
 
 async def send_teacher_notifications(
-    db: Session, event: AuxTeacherAddedEvent | AuxTeacherRemovedEvent
+    db: AsyncSession, event: AuxTeacherAddedEvent | AuxTeacherRemovedEvent
 ) -> None:
     """Main function to handle teacher notification sending."""
-    logger.info(f"Teacher event received: '{event}'")
+    logger.info("Teacher event received: '%s'", event)
 
     await process_user_notification(event.teacher_id, event, db)
@@ -1,9 +1,12 @@
-from src.consumers.event_router import EventRouter
+from src.supervisor import EVENTS_WORKERS, Supervisor, prepare_database, run_worker
 
 
 def main():
-    router = EventRouter()
-    router.start()
+    prepare_database()
+    if EVENTS_WORKERS > 1:
+        Supervisor(EVENTS_WORKERS).run()
+    else:
+        run_worker()
 
 
 if __name__ == "__main__":
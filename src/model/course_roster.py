@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, String
+from src.database.db import Base
+
+
+class RosterKind:
+    ENROLLMENTS = "enrollments"
+    FORUM = "forum"
+
+
+class CourseRoster(Base):
+    """A course roster kept locally, and when it was last synced with the courses service."""
+
+    __tablename__ = "course_rosters"
+
+    course_id = Column(String, primary_key=True)
+    kind = Column(String, primary_key=True)
+    synced_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class CourseRosterMember(Base):
+    __tablename__ = "course_roster_members"
+
+    course_id = Column(String, primary_key=True)
+    kind = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, DateTime, Index, String, func
+from src.database.db import Base
+
+
+class DeliveryChannel:
+    EMAIL = "email"
+    PUSH = "push"
+    DIGEST = "digest"
+
+
+class NotificationDelivery(Base):
+    """A notification that already went out to a recipient over one channel."""
+
+    __tablename__ = "notification_deliveries"
+
+    event_id = Column(String, primary_key=True)
+    recipient = Column(String, primary_key=True)
+    channel = Column(String, primary_key=True)
+    event_type = Column(String, nullable=False)
+    sent_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_notification_deliveries_recipient_sent_at", "recipient", "sent_at"),
+    )
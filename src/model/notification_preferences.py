@@ -1,6 +1,13 @@
 from sqlalchemy import Column, String, Boolean
 from src.database.db import Base
 
+
+class DigestFrequency:
+    IMMEDIATE = "immediate"
+    HOURLY = "hourly"
+    DAILY = "daily"
+
+
 class NotificationPreferences(Base):
     __tablename__ = "notification_preferences"
 
@@ -8,3 +15,10 @@ class NotificationPreferences(Base):
     event_type = Column(String, primary_key=True) 
     push_enabled = Column(Boolean, default=True, nullable=False)
     email_enabled = Column(Boolean, default=True, nullable=False)
+    # Added to existing databases at startup, see prepare_database
+    digest_frequency = Column(
+        String,
+        default=DigestFrequency.IMMEDIATE,
+        server_default=DigestFrequency.IMMEDIATE,
+        nullable=False,
+    )
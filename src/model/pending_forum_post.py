@@ -0,0 +1,36 @@
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    func,
+)
+from src.database.db import Base
+
+
+class PendingForumPost(Base):
+    """Forum post waiting to be notified in its course's next forum digest."""
+
+    __tablename__ = "pending_forum_posts"
+
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    course_id = Column(String, nullable=False)
+    post_id = Column(String, nullable=False)
+    student_id = Column(String, nullable=False)
+    post_text = Column(Text, nullable=False)
+    post_created_at = Column(DateTime(timezone=True), nullable=False)
+    received_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    # Redeliveries of the same post collapse into one row
+    __table_args__ = (
+        UniqueConstraint("course_id", "post_id", name="uq_pending_forum_posts_post"),
+    )
@@ -0,0 +1,25 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text, func
+from src.database.db import Base
+
+
+class PendingNotification(Base):
+    """Email notification waiting to be sent in a user's next digest."""
+
+    __tablename__ = "pending_notifications"
+
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    uid = Column(String, nullable=False)
+    frequency = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        Index("ix_pending_notifications_frequency_uid", "frequency", "uid", "id"),
+    )
@@ -0,0 +1,106 @@
+import asyncio
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.repository.notification_deliveries import (
+    add_deliveries,
+    get_delivered_channels,
+)
+from src.utils.context import event_id_var
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Deliveries written per bulk insert while a fan-out runs; a worker that dies
+# mid fan-out resends at most this many notifications on redelivery
+DELIVERY_LOG_BATCH_SIZE = int(os.getenv("DELIVERY_LOG_BATCH_SIZE", "100"))
+
+
+class DeliveryLog:
+    """
+    Send-log of one event: which recipients already got it on which channel,
+    so a retried or redelivered event resumes its fan-out instead of sending
+    to everyone again.
+
+    Deliveries are written in batches on the event's session, which the
+    fan-out does not use while recipients are notified; the lock keeps two
+    batches from using it at once. The session holds no connection between
+    batches.
+
+    Args:
+        db: Session of the event
+        event: The event being sent
+        event_id: Id of the event, the one of the delivery being processed by default.
+            Without an id nothing is skipped or recorded.
+    """
+
+    def __init__(self, db: AsyncSession, event, event_id: Optional[str] = None):
+        self.db = db
+        self.event = event
+        self.event_id = event_id or event_id_var.get()
+        self._delivered: Dict[str, Set[str]] = {}
+        self._pending: List[Tuple[str, str]] = []
+        self._lock = asyncio.Lock()
+
+    async def load(self, recipients: Iterable[str]) -> None:
+        """
+        Load what the given recipients already got, in a single query. The
+        event's transaction ends here so its connection goes back to the pool
+        while the fan-out runs; each flush checks one out again.
+        """
+        if self.event_id is not None:
+            self._delivered = await get_delivered_channels(
+                self.db, self.event_id, list(recipients)
+            )
+            if self._delivered:
+                logger.info(
+                    "%s recipients already got part of event %s",
+                    len(self._delivered),
+                    self.event_id,
+                )
+        await self.db.commit()
+
+    def delivered(self, uid: str, channel: str) -> bool:
+        return channel in self._delivered.get(uid, ())
+
+    async def record(self, uid: str, channel: str) -> None:
+        if self.event_id is None:
+            return
+        self._pending.append((uid, channel))
+        if len(self._pending) >= DELIVERY_LOG_BATCH_SIZE:
+            await self.flush()
+
+    async def record_many(self, uids: Iterable[str], channel: str) -> None:
+        for uid in uids:
+            await self.record(uid, channel)
+
+    async def flush(self) -> None:
+        """
+        Write the recorded deliveries. Errors are logged and not raised: the
+        notifications already went out and failing the event would resend them.
+        """
+        async with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            try:
+                await add_deliveries(
+                    self.db,
+                    [
+                        {
+                            "event_id": self.event_id,
+                            "recipient": uid,
+                            "channel": channel,
+                            "event_type": self.event.event_type,
+                        }
+                        for uid, channel in pending
+                    ],
+                )
+            except Exception as e:
+                await self.db.rollback()
+                logger.error(
+                    "Could not record %s deliveries of event %s: %s",
+                    len(pending),
+                    self.event_id,
+                    e,
+                )
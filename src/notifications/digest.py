@@ -0,0 +1,51 @@
+from typing import Dict, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.repository.pending_notifications import add_pending_notifications
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class DigestBuffer:
+    """
+    Collects the recipients of an event who get their emails as a digest and
+    stores the pending notification for all of them in one bulk insert.
+
+    Args:
+        event: The event to generate the email content from
+    """
+
+    def __init__(self, event):
+        self.event = event
+        self._recipients: Dict[str, str] = {}
+
+    def add(self, uid: str, frequency: str) -> None:
+        self._recipients[uid] = frequency
+
+    def __len__(self) -> int:
+        return len(self._recipients)
+
+    async def flush(self, db: AsyncSession) -> List[str]:
+        """Store the queued notifications. Returns the users they were stored for."""
+        recipients, self._recipients = self._recipients, {}
+        if not recipients:
+            return []
+
+        # The content is the same for every recipient, render it once
+        email_data = self.event.get_email_data()
+        await add_pending_notifications(
+            db,
+            [
+                {
+                    "uid": uid,
+                    "frequency": frequency,
+                    "subject": email_data["subject"],
+                    "content": email_data["content"],
+                }
+                for uid, frequency in recipients.items()
+            ],
+        )
+        logger.info(
+            "Queued %s for %s digest recipients", self.event.event_type, len(recipients)
+        )
+        return list(recipients)
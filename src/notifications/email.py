@@ -1,46 +1,219 @@
+import asyncio
 import os
+import time
 from email.message import EmailMessage
+from email.policy import SMTP
 import aiosmtplib
-from typing import Union
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from typing import Awaitable, Callable, List, Optional, Union
 
-from utils.logger import setup_logger
-from utils.result import Failure, Success
+from src.notifications.templates import RenderedEmail
+from src.utils.logger import SAMPLED, setup_logger
+from src.utils.metrics import SMTP_SEND_DURATION
+from src.utils.resilience import CircuitOpenError, protect
+from src.utils.tracing import tracer
+from src.utils.result import Failure, Success
 
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
 EMAIL_APP_PASSWORD = os.getenv("EMAIL_APP_PASSWORD")
+SMTP_HOSTNAME = os.getenv("SMTP_HOSTNAME", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_START_TLS = os.getenv("SMTP_START_TLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "3"))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(
+    os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100")
+)
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
 logger = setup_logger(__name__)
 
 
-async def send_notification_email(
-    to_email: str, subject: str, content: str
+class _PooledConnection:
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """
+    Small pool of authenticated SMTP connections.
+
+    Each connection does the STARTTLS + login handshake once and is then reused
+    for many messages, up to max_messages_per_connection, after which it is
+    recycled. Connections idle for longer than idle_timeout are reopened, and a
+    connection dropped by the server is reopened once before giving up.
+    """
+
+    def __init__(
+        self,
+        hostname: str = SMTP_HOSTNAME,
+        port: int = SMTP_PORT,
+        username: Optional[str] = EMAIL_ADDRESS,
+        password: Optional[str] = EMAIL_APP_PASSWORD,
+        start_tls: bool = SMTP_START_TLS,
+        size: int = SMTP_POOL_SIZE,
+        max_messages_per_connection: int = SMTP_MAX_MESSAGES_PER_CONNECTION,
+        idle_timeout: float = SMTP_IDLE_TIMEOUT,
+        timeout: float = SMTP_TIMEOUT,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username or None
+        self.password = password
+        self.start_tls = start_tls
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(size)
+        self._idle: List[_PooledConnection] = []
+
+    async def _connect(self) -> _PooledConnection:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        await smtp.connect()
+        return _PooledConnection(smtp)
+
+    def _take_idle(self) -> Optional[_PooledConnection]:
+        while self._idle:
+            connection = self._idle.pop()
+            if (
+                connection.smtp.is_connected
+                and time.monotonic() - connection.last_used < self.idle_timeout
+            ):
+                return connection
+            connection.smtp.close()
+        return None
+
+    async def _release(self, connection: _PooledConnection) -> None:
+        connection.sent += 1
+        connection.last_used = time.monotonic()
+        if connection.sent >= self.max_messages_per_connection:
+            await self._quit(connection)
+        else:
+            self._idle.append(connection)
+
+    async def _quit(self, connection: _PooledConnection) -> None:
+        try:
+            await connection.smtp.quit()
+        except Exception:
+            connection.smtp.close()
+
+    async def _send(self, send: Callable[[aiosmtplib.SMTP], Awaitable]) -> None:
+        async with self._semaphore:
+            connection = self._take_idle()
+            reused = connection is not None
+            try:
+                if connection is None:
+                    connection = await self._connect()
+                try:
+                    await send(connection.smtp)
+                except aiosmtplib.SMTPServerDisconnected:
+                    if not reused:
+                        raise
+                    # The server closed a kept-alive connection, retry on a fresh one
+                    connection = await self._connect()
+                    await send(connection.smtp)
+            except Exception:
+                if connection is not None:
+                    connection.smtp.close()
+                raise
+            await self._release(connection)
+
+    async def send_raw(self, sender: str, recipients: List[str], data: bytes) -> None:
+        """Send an already serialized message over a pooled connection."""
+        await self._send(lambda smtp: smtp.sendmail(sender, recipients, data))
+
+    async def close(self) -> None:
+        """Close every idle connection."""
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await self._quit(connection)
+
+
+smtp_pool = SMTPPool()
+
+
+def prepare_email(rendered: RenderedEmail) -> bytes:
+    """
+    Serialize a rendered email without its To header. This is done once per
+    rendering, every recipient then only costs prepending that header.
+    """
+    if rendered.mime is None:
+        message = EmailMessage(policy=SMTP)
+        message["From"] = EMAIL_ADDRESS
+        message["Subject"] = rendered.subject
+        message.set_content(rendered.text)
+        if rendered.html:
+            message.add_alternative(rendered.html, subtype="html")
+        rendered.mime = message.as_bytes()
+    return rendered.mime
+
+
+def _is_smtp_failure(error: Exception) -> bool:
+    # A refused recipient says nothing about the health of the server
+    return not isinstance(
+        error, (aiosmtplib.SMTPRecipientRefused, aiosmtplib.SMTPRecipientsRefused)
+    )
+
+
+def is_transient_smtp_error(error: Exception) -> bool:
+    """
+    Whether a failed send is worth retrying later: the server could not be
+    reached or answered with a temporary (4xx) error.
+    """
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return 400 <= error.code < 500
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(400 <= refused.code < 500 for refused in error.recipients)
+    return isinstance(
+        error,
+        (
+            CircuitOpenError,
+            aiosmtplib.SMTPServerDisconnected,
+            aiosmtplib.SMTPConnectError,
+            aiosmtplib.SMTPTimeoutError,
+            asyncio.TimeoutError,
+            OSError,
+        ),
+    )
+
+
+async def send_rendered_email(
+    to_email: str, rendered: RenderedEmail
 ) -> Union[Success, Failure]:
     """
-    Send a notification email with the provided subject and content.
+    Send a rendered email to one recipient.
 
     Args:
         to_email: Recipient's email address
-        subject: Email subject line
-        content: Email body content
+        rendered: Email rendered once for every recipient of the event
     """
-    try:
-        message = EmailMessage()
-        message["From"] = EMAIL_ADDRESS
-        message["To"] = to_email
-        message["Subject"] = subject
-        message.set_content(content)
-
-        await aiosmtplib.send(
-            message,
-            hostname="smtp.gmail.com",
-            port=587,
-            start_tls=True,
-            username=EMAIL_ADDRESS,
-            password=EMAIL_APP_PASSWORD,
-        )
+    started = time.perf_counter()
+    with tracer.start_as_current_span("smtp send", kind=SpanKind.CLIENT) as span:
+        try:
+            data = SMTP.fold_binary("To", to_email) + prepare_email(rendered)
+            async with protect("smtp", is_failure=_is_smtp_failure):
+                await smtp_pool.send_raw(EMAIL_ADDRESS, [to_email], data)
+            SMTP_SEND_DURATION.labels("ok").observe(time.perf_counter() - started)
 
-        logger.info(f"Email sent successfully to {to_email} with subject: {subject}")
-        return Success(f"Email de notificación enviado exitosamente a {to_email}")
+            logger.info(
+                "Email sent successfully to %s with subject: %s",
+                to_email,
+                rendered.subject,
+                extra=SAMPLED,
+            )
+            return Success(f"Email de notificación enviado exitosamente a {to_email}")
 
-    except Exception as e:
-        logger.error(f"Error sending email to {to_email}: {e}")
-        return Failure(Exception(f"Error al enviar email: {e}"))
+        except Exception as e:
+            SMTP_SEND_DURATION.labels("error").observe(time.perf_counter() - started)
+            span.record_exception(e)
+            span.set_status(Status(StatusCode.ERROR))
+            logger.error("Error sending email to %s: %s", to_email, e)
+            return Failure(e)
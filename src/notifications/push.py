@@ -1,7 +1,16 @@
-from firebase_admin import messaging
-import httpx
+import asyncio
+import os
+import time
+from firebase_admin import exceptions as firebase_exceptions, messaging
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from src.clients.http import get_client
+from src.utils.cache import MISSING, TTLCache
 from src.utils.logger import setup_logger
-from typing import List
+from src.utils.metrics import FCM_SEND_DURATION, UPSTREAM_REQUEST_DURATION
+from src.utils.resilience import CircuitOpenError, protect
+from src.utils.tracing import tracer
+from src.utils.fanout import limit
+from typing import Dict, List, Optional, Set
 from src.schemas.assignment_event import (
     AssignmentEvent,
     AssignmentReminder,
@@ -10,6 +19,41 @@ from src.schemas.assignment_event import (
 
 logger = setup_logger(__name__)
 
+# Maximum number of tokens FCM accepts in a single multicast message
+FCM_MULTICAST_LIMIT = 500
+
+fcm_token_cache = TTLCache(
+    "fcm_tokens",
+    maxsize=int(os.getenv("FCM_TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("FCM_TOKEN_CACHE_TTL", "300")),
+    negative_ttl=float(os.getenv("FCM_TOKEN_CACHE_NEGATIVE_TTL", "60")),
+)
+
+# Object providing send_each_for_multicast used when a PushDispatcher is not
+# given one, see configure_push_backend
+_push_backend = messaging
+
+
+def configure_push_backend(backend) -> None:
+    """Send push notifications through `backend`, e.g. a local FCM stand-in."""
+    global _push_backend
+    _push_backend = backend
+
+
+def is_transient_push_error(error: Exception) -> bool:
+    """Whether a failed FCM send is worth retrying later."""
+    return isinstance(
+        error,
+        (
+            CircuitOpenError,
+            OSError,
+            firebase_exceptions.UnavailableError,
+            firebase_exceptions.InternalError,
+            firebase_exceptions.DeadlineExceededError,
+            firebase_exceptions.ResourceExhaustedError,
+        ),
+    )
+
 
 def _get_notification_content(event: AssignmentEvent) -> tuple[str, str]:
     """
@@ -30,38 +74,137 @@ def _get_notification_content(event: AssignmentEvent) -> tuple[str, str]:
         return ("New Assignment", f"New assignment available: {event.assignment_title}")
 
 
-async def send_push_to_token(token: str, event: AssignmentEvent):
+def has_push_notification(event) -> bool:
+    """Whether the event is sent as a push notification at all."""
+    return _get_notification_content(event) is not None
+
+
+class PushDispatcher:
     """
-    Send a push notification to a specific FCM token.
+    Collects the FCM tokens of every recipient of an event and sends them
+    with send_each_for_multicast, in chunks of up to FCM_MULTICAST_LIMIT tokens.
 
-    Args:
-        token (str): The FCM token to send the notification to
-        event (AssignmentEvent): The event to generate notification content from
+    The blocking FCM call runs in a worker thread so the event loop keeps
+    serving other recipients and events meanwhile. Tokens reported as
+    unregistered are deleted, as before. Transient errors of failed sends are
+    kept in `errors` so the caller can retry the event once the rest is recorded.
 
-    Returns:
-        bool: True if the notification was sent successfully, False otherwise
+    Args:
+        event: The event to generate notification content from
+        backend: Object providing send_each_for_multicast, the configured push
+            backend (firebase_admin.messaging) by default
     """
-    try:
-        title, body = _get_notification_content(event)
-        message = messaging.Message(
+
+    def __init__(self, event, backend=None):
+        self.event = event
+        self.backend = backend or _push_backend
+        self._owners: Dict[str, str] = {}
+        self.errors: List[Exception] = []
+
+    def add(self, uid: str, tokens: List[str]) -> None:
+        """Queue the tokens of a user for the next flush."""
+        for token in tokens:
+            self._owners.setdefault(token, uid)
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    async def flush(self) -> Set[str]:
+        """
+        Send the notification to every queued token.
+
+        Returns:
+            Set[str]: IDs of the users reached on at least one device
+        """
+        owners, self._owners = self._owners, {}
+        if not owners:
+            return set()
+
+        content = _get_notification_content(self.event)
+        if content is None:
+            logger.warning(
+                "No push notification content for event type %s", self.event.event_type
+            )
+            return set()
+
+        title, body = content
+        tokens = list(owners)
+        chunks = [
+            tokens[i : i + FCM_MULTICAST_LIMIT]
+            for i in range(0, len(tokens), FCM_MULTICAST_LIMIT)
+        ]
+        results = await asyncio.gather(
+            *(self._send_chunk(chunk, title, body, owners) for chunk in chunks)
+        )
+        delivered = set().union(*results)
+        logger.info(
+            "Push notifications for %s reached %s users on %s tokens",
+            self.event.event_type,
+            len(delivered),
+            len(tokens),
+        )
+        return delivered
+
+    async def _send_chunk(
+        self, tokens: List[str], title: str, body: str, owners: Dict[str, str]
+    ) -> Set[str]:
+        message = messaging.MulticastMessage(
             notification=messaging.Notification(
                 title=title,
                 body=body,
             ),
-            token=token,
+            tokens=tokens,
         )
-        messaging.send(message)
-        logger.info(f"✅ Push notification sent to token: {token}")
-    except messaging.UnregisteredError:
-        logger.warning(f"❌ Invalid or expired token: {token}")
-        await delete_token(token=token)
-    except Exception as e:
-        logger.error(f"Error sending push notification: {e}, for token: {token}")
+        started = time.perf_counter()
+        with tracer.start_as_current_span(
+            "fcm multicast",
+            kind=SpanKind.CLIENT,
+            attributes={"fcm.tokens": len(tokens)},
+        ) as span:
+            try:
+                async with limit("push"), protect("fcm"):
+                    batch = await asyncio.to_thread(
+                        self.backend.send_each_for_multicast, message
+                    )
+                FCM_SEND_DURATION.labels("ok").observe(time.perf_counter() - started)
+            except Exception as e:
+                FCM_SEND_DURATION.labels("error").observe(time.perf_counter() - started)
+                span.record_exception(e)
+                span.set_status(Status(StatusCode.ERROR))
+                logger.error(
+                    "Error sending push notifications to %s tokens: %s", len(tokens), e
+                )
+                if is_transient_push_error(e):
+                    self.errors.append(e)
+                return set()
+            span.set_attribute("fcm.failures", batch.failure_count)
+
+        delivered = set()
+        unregistered = []
+        for token, response in zip(tokens, batch.responses):
+            if response.success:
+                delivered.add(owners[token])
+            elif isinstance(response.exception, messaging.UnregisteredError):
+                logger.warning("❌ Invalid or expired token: %s", token)
+                unregistered.append(token)
+            else:
+                logger.error(
+                    "Error sending push notification: %s, for token: %s",
+                    response.exception,
+                    token,
+                )
+
+        await asyncio.gather(
+            *(delete_token(token=token, uid=owners[token]) for token in unregistered)
+        )
+        return delivered
 
 
 async def get_user_fcm_tokens(uid: str) -> List[str]:
     """
-    Get all FCM tokens associated with a user.
+    Get all FCM tokens associated with a user, going through the token cache.
+    Failures are raised, so the recipient counts as failed and transient
+    errors retry the event.
 
     Args:
         uid (str): The user ID to get tokens for
@@ -69,34 +212,47 @@ async def get_user_fcm_tokens(uid: str) -> List[str]:
     Returns:
         List[str]: List of FCM tokens for the user
     """
+    cached = fcm_token_cache.get(uid)
+    if cached is not MISSING:
+        return cached
+
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://class-connect-main-95f2455.zuplo.app/user/tokens/{uid}",
-                params={"uid": uid},
-                timeout=5,
-            )
-            response.raise_for_status()
-            data = response.json()
-            return [t["fcm_token"] for t in data]
+        async with limit("tokens"):
+            with UPSTREAM_REQUEST_DURATION.labels("gateway", "get_tokens").time():
+                response = await get_client("gateway").get(
+                    "/user/tokens/{uid}",
+                    params={"uid": uid},
+                )
+        response.raise_for_status()
+        data = response.json()
+        tokens = [t["fcm_token"] for t in data]
+        if tokens:
+            fcm_token_cache.set(uid, tokens)
+        else:
+            fcm_token_cache.set_negative(uid, tokens)
+        return tokens
     except Exception as e:
-        logger.error(f"Error getting FCM tokens for user {uid}: {e}")
-        return []
+        logger.error("Error getting FCM tokens for user %s: %s", uid, e)
+        raise
 
 
-async def delete_token(token: str) -> None:
+async def delete_token(token: str, uid: Optional[str] = None) -> None:
     """
-    Delete an FCM token from the notifications service.
+    Delete an FCM token from the notifications service and drop it from the cache.
 
     Args:
         token (str): The FCM token to delete
+        uid (Optional[str]): Owner of the token, if known
     """
+    if uid is not None:
+        fcm_token_cache.invalidate(uid)
+    else:
+        fcm_token_cache.invalidate_where(lambda tokens: token in tokens)
+
     try:
-        async with httpx.AsyncClient() as client:
-            await client.delete(
-                f"https://class-connect-main-95f2455.zuplo.app/notifications/token/{token}",
-                timeout=5,
-            )
-            logger.info(f"Successfully deleted token: {token}")
+        async with limit("tokens"):
+            with UPSTREAM_REQUEST_DURATION.labels("gateway", "delete_token").time():
+                await get_client("gateway").delete(f"/notifications/token/{token}")
+        logger.info("Successfully deleted token: %s", token)
     except Exception as e:
-        logger.error(f"Error deleting token {token}: {e}")
\ No newline at end of file
+        logger.error("Error deleting token %s: %s", token, e)
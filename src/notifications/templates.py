@@ -0,0 +1,481 @@
+import html
+import os
+from dataclasses import dataclass
+from string import Template
+from textwrap import dedent
+from typing import Any, Dict, Mapping, Optional
+
+# Locale used when the recipient's one is unknown or has no template
+EMAIL_DEFAULT_LOCALE = os.getenv("EMAIL_DEFAULT_LOCALE", "es")
+# Locale every template exists in, the last fallback
+FALLBACK_LOCALE = "es"
+
+
+class SafeHtml(str):
+    """A context value that is already HTML and is not escaped again."""
+
+
+@dataclass
+class RenderedEmail:
+    """
+    Subject and bodies of an email, rendered once per event and shared by
+    every recipient. `mime` caches the serialized message without the To
+    header, see prepare_email.
+    """
+
+    subject: str
+    text: str
+    html: Optional[str] = None
+    mime: Optional[bytes] = None
+
+
+class EmailTemplate:
+    """Subject, plain-text and optional HTML templates, compiled once."""
+
+    def __init__(self, subject: str, text: str, html_body: Optional[str] = None):
+        self.subject = Template(subject)
+        self.text = Template(dedent(text).strip() + "\n")
+        self.html = Template(dedent(html_body).strip()) if html_body else None
+
+    def render(self, context: Mapping[str, Any]) -> RenderedEmail:
+        values = {
+            key: value if isinstance(value, str) else str(value)
+            for key, value in context.items()
+        }
+        html_values = {
+            key: value if isinstance(value, SafeHtml) else html.escape(value)
+            for key, value in values.items()
+        }
+        return RenderedEmail(
+            subject=self.subject.substitute(values),
+            text=self.text.substitute(values),
+            html=self.html.substitute(html_values) if self.html else None,
+        )
+
+
+def _html(*paragraphs: str) -> str:
+    body = "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+    return f'<html><body style="font-family: sans-serif">{body}</body></html>'
+
+
+TEMPLATES: Dict[str, Dict[str, EmailTemplate]] = {
+    "assignment.reminder": {
+        "es": EmailTemplate(
+            "Recordatorio de asignación: $assignment_title",
+            """
+            Recordatorio: Tienes una asignación próxima a vencer.
+
+            Título: $assignment_title
+            Fecha de entrega: $due_date
+
+            ¡Asegúrate de completarla antes de la fecha límite!
+            """,
+            _html(
+                "Recordatorio: Tienes una asignación próxima a vencer.",
+                "<b>Título:</b> $assignment_title<br><b>Fecha de entrega:</b> $due_date",
+                "¡Asegúrate de completarla antes de la fecha límite!",
+            ),
+        ),
+        "en": EmailTemplate(
+            "Assignment reminder: $assignment_title",
+            """
+            Reminder: you have an assignment due soon.
+
+            Title: $assignment_title
+            Due date: $due_date
+
+            Make sure to complete it before the deadline!
+            """,
+            _html(
+                "Reminder: you have an assignment due soon.",
+                "<b>Title:</b> $assignment_title<br><b>Due date:</b> $due_date",
+                "Make sure to complete it before the deadline!",
+            ),
+        ),
+    },
+    "assignment.created": {
+        "es": EmailTemplate(
+            "Nueva asignación: $assignment_title",
+            """
+            Se ha creado una nueva asignación en tu curso.
+
+            Título: $assignment_title
+            Fecha de entrega: $due_date
+
+            ¡No olvides completarla a tiempo!
+            """,
+            _html(
+                "Se ha creado una nueva asignación en tu curso.",
+                "<b>Título:</b> $assignment_title<br><b>Fecha de entrega:</b> $due_date",
+                "¡No olvides completarla a tiempo!",
+            ),
+        ),
+        "en": EmailTemplate(
+            "New assignment: $assignment_title",
+            """
+            A new assignment was created in your course.
+
+            Title: $assignment_title
+            Due date: $due_date
+
+            Don't forget to complete it on time!
+            """,
+            _html(
+                "A new assignment was created in your course.",
+                "<b>Title:</b> $assignment_title<br><b>Due date:</b> $due_date",
+                "Don't forget to complete it on time!",
+            ),
+        ),
+    },
+    "aux_teacher.added": {
+        "es": EmailTemplate(
+            "Has sido agregado como profesor auxiliar",
+            """
+            Has sido agregado como profesor auxiliar en el curso.
+
+            Curso: $course_name
+            ID del curso: $course_id
+
+            Ya puedes acceder al contenido y gestionar el curso.
+            """,
+            _html(
+                "Has sido agregado como profesor auxiliar en el curso.",
+                "<b>Curso:</b> $course_name<br><b>ID del curso:</b> $course_id",
+                "Ya puedes acceder al contenido y gestionar el curso.",
+            ),
+        ),
+        "en": EmailTemplate(
+            "You were added as an assistant teacher",
+            """
+            You were added as an assistant teacher of the course.
+
+            Course: $course_name
+            Course ID: $course_id
+
+            You can now access the content and manage the course.
+            """,
+            _html(
+                "You were added as an assistant teacher of the course.",
+                "<b>Course:</b> $course_name<br><b>Course ID:</b> $course_id",
+                "You can now access the content and manage the course.",
+            ),
+        ),
+    },
+    "aux_teacher.removed": {
+        "es": EmailTemplate(
+            "Has sido removido como profesor auxiliar",
+            """
+            Has sido removido como profesor auxiliar del curso.
+
+            Curso: $course_name
+            ID del curso: $course_id
+
+            Ya no tienes acceso al contenido del curso.
+            """,
+            _html(
+                "Has sido removido como profesor auxiliar del curso.",
+                "<b>Curso:</b> $course_name<br><b>ID del curso:</b> $course_id",
+                "Ya no tienes acceso al contenido del curso.",
+            ),
+        ),
+        "en": EmailTemplate(
+            "You were removed as an assistant teacher",
+            """
+            You were removed as an assistant teacher of the course.
+
+            Course: $course_name
+            Course ID: $course_id
+
+            You no longer have access to the course content.
+            """,
+            _html(
+                "You were removed as an assistant teacher of the course.",
+                "<b>Course:</b> $course_name<br><b>Course ID:</b> $course_id",
+                "You no longer have access to the course content.",
+            ),
+        ),
+    },
+    "feedback.created": {
+        "es": EmailTemplate(
+            "Nuevo feedback recibido",
+            """
+            Has recibido nuevo feedback de tu profesor.
+
+            Curso ID: $course_id
+            Calificación: $feedback_rating/5
+            Comentario: $feedback_text
+            Fecha: $created_at
+
+            ¡Revisa el feedback para mejorar tu desempeño!
+            """,
+            _html(
+                "Has recibido nuevo feedback de tu profesor.",
+                "<b>Curso ID:</b> $course_id<br><b>Calificación:</b> $feedback_rating/5"
+                "<br><b>Comentario:</b> $feedback_text<br><b>Fecha:</b> $created_at",
+                "¡Revisa el feedback para mejorar tu desempeño!",
+            ),
+        ),
+        "en": EmailTemplate(
+            "New feedback received",
+            """
+            You received new feedback from your teacher.
+
+            Course ID: $course_id
+            Rating: $feedback_rating/5
+            Comment: $feedback_text
+            Date: $created_at
+
+            Check the feedback to improve your performance!
+            """,
+            _html(
+                "You received new feedback from your teacher.",
+                "<b>Course ID:</b> $course_id<br><b>Rating:</b> $feedback_rating/5"
+                "<br><b>Comment:</b> $feedback_text<br><b>Date:</b> $created_at",
+                "Check the feedback to improve your performance!",
+            ),
+        ),
+    },
+    "student.enrolled": {
+        "es": EmailTemplate(
+            "Inscripción exitosa",
+            """
+            ¡Te has inscrito exitosamente en el curso!
+
+            Curso ID: $course_id
+
+            Ya puedes acceder al contenido del curso y comenzar tu aprendizaje.
+            """,
+            _html(
+                "¡Te has inscrito exitosamente en el curso!",
+                "<b>Curso ID:</b> $course_id",
+                "Ya puedes acceder al contenido del curso y comenzar tu aprendizaje.",
+            ),
+        ),
+        "en": EmailTemplate(
+            "Enrollment successful",
+            """
+            You enrolled in the course successfully!
+
+            Course ID: $course_id
+
+            You can now access the course content and start learning.
+            """,
+            _html(
+                "You enrolled in the course successfully!",
+                "<b>Course ID:</b> $course_id",
+                "You can now access the course content and start learning.",
+            ),
+        ),
+    },
+    "student.unenrolled": {
+        "es": EmailTemplate(
+            "Has sido desinscrito del curso",
+            """
+            Has sido desinscrito del curso.
+
+            Curso ID: $course_id
+
+            Ya no tienes acceso al contenido del curso.
+            """,
+            _html(
+                "Has sido desinscrito del curso.",
+                "<b>Curso ID:</b> $course_id",
+                "Ya no tienes acceso al contenido del curso.",
+            ),
+        ),
+        "en": EmailTemplate(
+            "You were unenrolled from the course",
+            """
+            You were unenrolled from the course.
+
+            Course ID: $course_id
+
+            You no longer have access to the course content.
+            """,
+            _html(
+                "You were unenrolled from the course.",
+                "<b>Course ID:</b> $course_id",
+                "You no longer have access to the course content.",
+            ),
+        ),
+    },
+    "forum.activity": {
+        "es": EmailTemplate(
+            "Nueva actividad en el foro",
+            """
+            Hay nueva actividad en el foro de tu curso.
+
+            Curso ID: $course_id
+            Post: $post_excerpt
+            Fecha: $created_at
+
+            ¡Participa en la discusión!
+            """,
+            _html(
+                "Hay nueva actividad en el foro de tu curso.",
+                "<b>Curso ID:</b> $course_id<br><b>Post:</b> $post_excerpt"
+                "<br><b>Fecha:</b> $created_at",
+                "¡Participa en la discusión!",
+            ),
+        ),
+        "en": EmailTemplate(
+            "New forum activity",
+            """
+            There is new activity in your course forum.
+
+            Course ID: $course_id
+            Post: $post_excerpt
+            Date: $created_at
+
+            Join the discussion!
+            """,
+            _html(
+                "There is new activity in your course forum.",
+                "<b>Course ID:</b> $course_id<br><b>Post:</b> $post_excerpt"
+                "<br><b>Date:</b> $created_at",
+                "Join the discussion!",
+            ),
+        ),
+    },
+    "forum.activity.digest": {
+        "es": EmailTemplate(
+            "$post_count nuevas publicaciones en el foro",
+            """
+            Hay nueva actividad en el foro de tu curso.
+
+            Curso ID: $course_id
+            Nuevas publicaciones:
+            $posts
+
+            ¡Participa en la discusión!
+            """,
+            _html(
+                "Hay nueva actividad en el foro de tu curso.",
+                "<b>Curso ID:</b> $course_id<br><b>Nuevas publicaciones:</b>",
+            ).replace(
+                "</body>", "$posts_html<p>¡Participa en la discusión!</p></body>"
+            ),
+        ),
+        "en": EmailTemplate(
+            "$post_count new forum posts",
+            """
+            There is new activity in your course forum.
+
+            Course ID: $course_id
+            New posts:
+            $posts
+
+            Join the discussion!
+            """,
+            _html(
+                "There is new activity in your course forum.",
+                "<b>Course ID:</b> $course_id<br><b>New posts:</b>",
+            ).replace("</body>", "$posts_html<p>Join the discussion!</p></body>"),
+        ),
+    },
+    "submission.corrected": {
+        "es": EmailTemplate(
+            "Tu entrega ha sido corregida",
+            """
+            Tu entrega ha sido corregida.
+
+            Curso ID: $course_id
+            Asignación ID: $assignment_id
+            $score_text
+            Tipo de corrección: $review_text
+            Feedback: $feedback
+            Fecha de corrección: $corrected_at
+
+            ¡Revisa los resultados!
+            """,
+            _html(
+                "Tu entrega ha sido corregida.",
+                "<b>Curso ID:</b> $course_id<br><b>Asignación ID:</b> $assignment_id"
+                "<br>$score_text<br><b>Tipo de corrección:</b> $review_text"
+                "<br><b>Feedback:</b> $feedback"
+                "<br><b>Fecha de corrección:</b> $corrected_at",
+                "¡Revisa los resultados!",
+            ),
+        ),
+        "en": EmailTemplate(
+            "Your submission was corrected",
+            """
+            Your submission was corrected.
+
+            Course ID: $course_id
+            Assignment ID: $assignment_id
+            $score_text
+            Correction type: $review_text
+            Feedback: $feedback
+            Corrected at: $corrected_at
+
+            Check the results!
+            """,
+            _html(
+                "Your submission was corrected.",
+                "<b>Course ID:</b> $course_id<br><b>Assignment ID:</b> $assignment_id"
+                "<br>$score_text<br><b>Correction type:</b> $review_text"
+                "<br><b>Feedback:</b> $feedback"
+                "<br><b>Corrected at:</b> $corrected_at",
+                "Check the results!",
+            ),
+        ),
+    },
+    "notifications.digest": {
+        "es": EmailTemplate(
+            "Resumen: $count notificaciones nuevas",
+            """
+            Este es tu resumen de notificaciones.
+
+            $sections
+            """,
+            _html("Este es tu resumen de notificaciones.").replace(
+                "</body>", "$sections_html</body>"
+            ),
+        ),
+        "en": EmailTemplate(
+            "Digest: $count new notifications",
+            """
+            This is your notification digest.
+
+            $sections
+            """,
+            _html("This is your notification digest.").replace(
+                "</body>", "$sections_html</body>"
+            ),
+        ),
+    },
+}
+
+# Texts of the submission.corrected template that depend on the correction
+SUBMISSION_TEXTS: Dict[str, Dict[str, str]] = {
+    "es": {
+        "score": "Puntuación: {score}",
+        "no_score": "Sin puntuación",
+        "manual_review": "Necesita revisión manual",
+        "automatic": "Corrección automática",
+    },
+    "en": {
+        "score": "Score: {score}",
+        "no_score": "No score",
+        "manual_review": "Needs manual review",
+        "automatic": "Automatic correction",
+    },
+}
+
+
+def resolve_locale(name: str, locale: Optional[str] = None) -> str:
+    """
+    Locale the template of an event type is rendered in: the given one if it
+    exists, else EMAIL_DEFAULT_LOCALE and then FALLBACK_LOCALE.
+    """
+    templates = TEMPLATES[name]
+    for candidate in (locale, EMAIL_DEFAULT_LOCALE, FALLBACK_LOCALE):
+        if candidate in templates:
+            return candidate
+    raise KeyError(f"No template for {name} in locale {locale}")
+
+
+def get_template(name: str, locale: Optional[str] = None) -> EmailTemplate:
+    """Get the template of an event type in the given locale, see resolve_locale."""
+    return TEMPLATES[name][resolve_locale(name, locale)]
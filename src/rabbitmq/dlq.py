@@ -0,0 +1,122 @@
+"""
+Inspect and replay messages in the dead-letter queues of the notification lanes.
+
+Usage:
+    python -m src.rabbitmq.dlq [--lane NAME] list [--limit N]
+    python -m src.rabbitmq.dlq [--lane NAME] replay [--limit N]
+    python -m src.rabbitmq.dlq [--lane NAME] purge
+
+Every lane's DLQ (<queue>.<lane>.dlq) is used unless --lane is given; --limit
+applies to each lane. Replayed messages go back onto their lane's queue.
+"""
+
+import argparse
+import asyncio
+import os
+import aio_pika
+from src.rabbitmq.connection import get_rabbitmq_connection
+from src.rabbitmq.topology import (
+    EVENT_LANES,
+    LAST_ERROR_HEADER,
+    RETRY_COUNT_HEADER,
+    dead_letter_queue_name,
+    lane_queue_name,
+)
+
+
+async def list_messages(channel, queue_name: str, limit: int) -> None:
+    """Print up to limit messages and leave them in the DLQ."""
+    dlq = await channel.declare_queue(dead_letter_queue_name(queue_name), durable=True)
+    messages = []
+    while len(messages) < limit:
+        message = await dlq.get(fail=False)
+        if message is None:
+            break
+        messages.append(message)
+        headers = message.headers or {}
+        print(
+            f"[{len(messages)}] retries={headers.get(RETRY_COUNT_HEADER, 0)} "
+            f"error={headers.get(LAST_ERROR_HEADER, '')!r}"
+        )
+        print(f"    {message.body.decode(errors='replace')[:500]}")
+
+    # Messages are held unacked until the end so the same one is not read twice
+    for message in messages:
+        await message.nack(requeue=True)
+    print(f"{len(messages)} messages listed from {dead_letter_queue_name(queue_name)}")
+
+
+async def replay_messages(channel, queue_name: str, limit: int) -> None:
+    """Move up to limit messages back onto the main queue with a fresh retry count."""
+    dlq = await channel.declare_queue(dead_letter_queue_name(queue_name), durable=True)
+    replayed = 0
+    while replayed < limit:
+        message = await dlq.get(fail=False)
+        if message is None:
+            break
+        headers = dict(message.headers or {})
+        headers.pop(RETRY_COUNT_HEADER, None)
+        await channel.default_exchange.publish(
+            aio_pika.Message(
+                body=message.body,
+                headers=headers,
+                content_type=message.content_type,
+                message_id=message.message_id,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=queue_name,
+        )
+        await message.ack()
+        replayed += 1
+    print(f"{replayed} messages replayed onto {queue_name}")
+
+
+async def purge_messages(channel, queue_name: str) -> None:
+    dlq = await channel.declare_queue(dead_letter_queue_name(queue_name), durable=True)
+    result = await dlq.purge()
+    print(f"{result.message_count} messages purged from {dlq.name}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    connection = await get_rabbitmq_connection()
+    try:
+        channel = await connection.channel()
+        lanes = args.lane or [lane.name for lane in EVENT_LANES]
+        for queue_name in (lane_queue_name(args.queue, lane) for lane in lanes):
+            if args.command == "list":
+                await list_messages(channel, queue_name, args.limit)
+            elif args.command == "replay":
+                await replay_messages(channel, queue_name, args.limit)
+            elif args.command == "purge":
+                await purge_messages(channel, queue_name)
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--queue",
+        default=os.getenv("NOTIFICATIONS_QUEUE_NAME"),
+        help="Queue the lane queues are named after (defaults to NOTIFICATIONS_QUEUE_NAME)",
+    )
+    parser.add_argument(
+        "--lane",
+        action="append",
+        choices=[lane.name for lane in EVENT_LANES],
+        help="Lane whose DLQ is used, can be repeated (defaults to every lane)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in ("list", "replay"):
+        subparser = subparsers.add_parser(command)
+        subparser.add_argument("--limit", type=int, default=100)
+    subparsers.add_parser("purge")
+
+    args = parser.parse_args()
+    if not args.queue:
+        parser.error("--queue or NOTIFICATIONS_QUEUE_NAME is required")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import uuid
+from typing import Optional
+import aio_pika
+from aio_pika.abc import AbstractExchange
+from pydantic import BaseModel
+from src.utils.tracing import inject_context
+
+# Exchange events are published to, set by the router once it declared it,
+# see configure_publisher
+_exchange: Optional[AbstractExchange] = None
+
+
+def configure_publisher(exchange: AbstractExchange) -> None:
+    """Publish events to `exchange`, the notifications exchange."""
+    global _exchange
+    _exchange = exchange
+
+
+async def publish_event(event: BaseModel, message_id: Optional[str] = None) -> None:
+    """
+    Publish an event to the notifications exchange with its event type as
+    routing key, carrying the current trace context. Without a message_id
+    the event gets a new one.
+    """
+    if _exchange is None:
+        raise RuntimeError("The event publisher is not configured")
+    await _exchange.publish(
+        aio_pika.Message(
+            body=event.model_dump_json().encode(),
+            headers=inject_context({}),
+            content_type="application/json",
+            message_id=message_id or uuid.uuid4().hex,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        ),
+        routing_key=event.event_type,
+    )
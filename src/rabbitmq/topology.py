@@ -0,0 +1,224 @@
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import aio_pika
+from aio_pika.abc import (
+    AbstractChannel,
+    AbstractExchange,
+    AbstractIncomingMessage,
+    AbstractQueue,
+)
+
+# Delay before each retry; a message that fails once more goes to the DLQ
+EVENTS_RETRY_DELAYS_MS = [
+    int(delay)
+    for delay in os.getenv("EVENTS_RETRY_DELAYS_MS", "5000,30000,300000").split(",")
+    if delay.strip()
+]
+RETRY_COUNT_HEADER = "x-retry-count"
+LAST_ERROR_HEADER = "x-last-error"
+
+# Topic exchange events are published to, with their event type as routing key
+NOTIFICATIONS_EXCHANGE_NAME = os.getenv("NOTIFICATIONS_EXCHANGE_NAME", "notifications")
+
+
+@dataclass(frozen=True)
+class Lane:
+    """
+    A queue of the notifications exchange, bound to some event types and
+    consumed with its own concurrency budget.
+    """
+
+    name: str
+    bindings: Tuple[str, ...]
+    max_concurrency: int
+    prefetch_count: int
+
+
+def lane_from_env(
+    name: str,
+    bindings: str,
+    max_concurrency: int,
+    prefetch_count: Optional[int] = None,
+) -> Lane:
+    """
+    Build a lane whose settings can be overridden with EVENTS_<NAME>_BINDINGS
+    (comma separated routing keys), EVENTS_<NAME>_CONCURRENCY and
+    EVENTS_<NAME>_PREFETCH_COUNT.
+    """
+    prefix = f"EVENTS_{name.upper()}"
+    max_concurrency = int(os.getenv(f"{prefix}_CONCURRENCY", str(max_concurrency)))
+    prefetch_count = int(
+        os.getenv(f"{prefix}_PREFETCH_COUNT", str(prefetch_count or max_concurrency))
+    )
+    return Lane(
+        name=name,
+        bindings=tuple(
+            key.strip()
+            for key in os.getenv(f"{prefix}_BINDINGS", bindings).split(",")
+            if key.strip()
+        ),
+        max_concurrency=max_concurrency,
+        prefetch_count=prefetch_count,
+    )
+
+
+# Deliveries of the bulk lane processed at the same time
+EVENTS_MAX_CONCURRENCY = int(os.getenv("EVENTS_MAX_CONCURRENCY", "50"))
+# Unacknowledged deliveries the broker hands to this worker at once
+EVENTS_PREFETCH_COUNT = int(
+    os.getenv("EVENTS_PREFETCH_COUNT", str(EVENTS_MAX_CONCURRENCY))
+)
+# Single-recipient events are consumed apart from course-wide fan-outs, so
+# they never wait behind a burst of them
+EVENT_LANES = [
+    lane_from_env(
+        "priority",
+        "feedback.created,submission.corrected,aux_teacher.*,student.*",
+        20,
+    ),
+    lane_from_env(
+        "bulk",
+        "assignment.*,forum.*,fanout.*",
+        EVENTS_MAX_CONCURRENCY,
+        EVENTS_PREFETCH_COUNT,
+    ),
+]
+# Lane of the event types no lane is bound to
+EVENTS_DEFAULT_LANE = os.getenv("EVENTS_DEFAULT_LANE", "bulk")
+
+
+def lane_queue_name(queue_name: str, lane: str) -> str:
+    return f"{queue_name}.{lane}"
+
+
+def unrouted_exchange_name(exchange_name: str) -> str:
+    return f"{exchange_name}.unrouted"
+
+
+def retry_queue_name(queue_name: str, attempt: int) -> str:
+    return f"{queue_name}.retry.{attempt}"
+
+
+def dead_letter_queue_name(queue_name: str) -> str:
+    return f"{queue_name}.dlq"
+
+
+async def declare_retry_topology(
+    channel: AbstractChannel,
+    queue_name: str,
+    delays: List[int] = EVENTS_RETRY_DELAYS_MS,
+) -> None:
+    """
+    Declare one delay queue per retry attempt and the dead-letter queue.
+
+    Retry queues have no consumers: messages wait there for the queue's TTL
+    and are then dead-lettered back onto queue_name through the default exchange.
+    """
+    for attempt, delay in enumerate(delays, start=1):
+        await channel.declare_queue(
+            retry_queue_name(queue_name, attempt),
+            durable=True,
+            arguments={
+                "x-message-ttl": delay,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": queue_name,
+            },
+        )
+    await channel.declare_queue(dead_letter_queue_name(queue_name), durable=True)
+
+
+async def declare_notifications_exchange(
+    channel: AbstractChannel, exchange_name: str = NOTIFICATIONS_EXCHANGE_NAME
+) -> AbstractExchange:
+    """
+    Declare the topic exchange events are published to. Messages no lane is
+    bound to go to its alternate exchange, where the default lane picks them up.
+    """
+    await channel.declare_exchange(
+        unrouted_exchange_name(exchange_name),
+        type=aio_pika.ExchangeType.FANOUT,
+        durable=True,
+    )
+    return await channel.declare_exchange(
+        exchange_name,
+        type=aio_pika.ExchangeType.TOPIC,
+        durable=True,
+        arguments={"alternate-exchange": unrouted_exchange_name(exchange_name)},
+    )
+
+
+async def declare_lane_queue(
+    channel: AbstractChannel,
+    queue_name: str,
+    lane: Lane,
+    exchange_name: str = NOTIFICATIONS_EXCHANGE_NAME,
+    default: bool = False,
+) -> AbstractQueue:
+    """
+    Declare the queue of a lane bound to the exchange with the lane's routing
+    keys, and its retry queues. The default lane also gets unrouted messages.
+    """
+    queue = await channel.declare_queue(
+        lane_queue_name(queue_name, lane.name), durable=True
+    )
+    for routing_key in lane.bindings:
+        await queue.bind(exchange_name, routing_key=routing_key)
+    if default:
+        await queue.bind(unrouted_exchange_name(exchange_name))
+    await declare_retry_topology(channel, queue.name)
+    return queue
+
+
+def copy_message(
+    message: AbstractIncomingMessage,
+    headers: Optional[Dict] = None,
+    message_id: Optional[str] = None,
+) -> aio_pika.Message:
+    """
+    A persistent copy of a delivery to publish again, with the given headers.
+    It keeps the message id, given or of the delivery; a delivery without one
+    gets a new id here, so every event has one from then on.
+    """
+    return aio_pika.Message(
+        body=message.body,
+        headers=headers if headers is not None else dict(message.headers or {}),
+        content_type=message.content_type,
+        message_id=message_id or message.message_id or uuid.uuid4().hex,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+    )
+
+
+def get_retry_count(message: AbstractIncomingMessage) -> int:
+    return int((message.headers or {}).get(RETRY_COUNT_HEADER, 0))
+
+
+async def schedule_retry(
+    channel: AbstractChannel,
+    queue_name: str,
+    message: AbstractIncomingMessage,
+    error: Exception,
+    delays: List[int] = EVENTS_RETRY_DELAYS_MS,
+    dead_letter: bool = False,
+    message_id: Optional[str] = None,
+) -> str:
+    """
+    Republish a failed message to its next retry queue, or to the DLQ once
+    retries are exhausted (or right away when dead_letter is set). The copy
+    gets message_id when the delivery had none, so the retry keeps its event id.
+    Returns the name of the queue the message was published to.
+    """
+    retries = get_retry_count(message)
+    if dead_letter or retries >= len(delays):
+        target = dead_letter_queue_name(queue_name)
+    else:
+        target = retry_queue_name(queue_name, retries + 1)
+
+    headers = dict(message.headers or {})
+    headers[RETRY_COUNT_HEADER] = retries + 1
+    headers[LAST_ERROR_HEADER] = str(error)[:1000]
+    await channel.default_exchange.publish(
+        copy_message(message, headers, message_id), routing_key=target
+    )
+    return target
@@ -0,0 +1,108 @@
+import os
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import and_, delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.model.course_roster import CourseRoster, CourseRosterMember
+
+# Resolve course recipients from the local roster tables instead of the courses service
+ROSTER_CACHE_ENABLED = os.getenv("ROSTER_CACHE_ENABLED", "true").lower() == "true"
+
+
+async def get_roster(
+    db: AsyncSession, course_id: str, kind: str
+) -> Optional[list[str]]:
+    """
+    Return the members of a locally cached roster in a single query,
+    or None if the roster was never synced.
+    """
+    result = await db.execute(
+        select(CourseRoster.synced_at, CourseRosterMember.user_id)
+        .outerjoin(
+            CourseRosterMember,
+            and_(
+                CourseRosterMember.course_id == CourseRoster.course_id,
+                CourseRosterMember.kind == CourseRoster.kind,
+            ),
+        )
+        .where(CourseRoster.course_id == course_id, CourseRoster.kind == kind)
+    )
+    rows = result.all()
+    if not rows:
+        return None
+    return [user_id for _, user_id in rows if user_id is not None]
+
+
+async def replace_roster(
+    db: AsyncSession, course_id: str, kind: str, user_ids: list[str]
+) -> None:
+    """Replace every member of a roster and mark it as synced now. Does not commit."""
+    await db.execute(
+        delete(CourseRosterMember).where(
+            CourseRosterMember.course_id == course_id, CourseRosterMember.kind == kind
+        )
+    )
+    if user_ids:
+        await db.execute(
+            insert(CourseRosterMember),
+            [
+                {"course_id": course_id, "kind": kind, "user_id": user_id}
+                for user_id in dict.fromkeys(user_ids)
+            ],
+        )
+    await db.merge(
+        CourseRoster(
+            course_id=course_id, kind=kind, synced_at=datetime.now(timezone.utc)
+        )
+    )
+
+
+async def add_roster_member(
+    db: AsyncSession, course_id: str, kind: str, user_id: str
+) -> None:
+    """Add a member to a roster, if that roster is cached locally."""
+    if await db.get(CourseRoster, (course_id, kind)) is None:
+        return
+    if await db.get(CourseRosterMember, (course_id, kind, user_id)) is None:
+        db.add(CourseRosterMember(course_id=course_id, kind=kind, user_id=user_id))
+    await db.commit()
+
+
+async def remove_roster_member(
+    db: AsyncSession, course_id: str, kind: str, user_id: str
+) -> None:
+    await db.execute(
+        delete(CourseRosterMember).where(
+            CourseRosterMember.course_id == course_id,
+            CourseRosterMember.kind == kind,
+            CourseRosterMember.user_id == user_id,
+        )
+    )
+    await db.commit()
+
+
+async def claim_stale_rosters(
+    db: AsyncSession, synced_before: datetime, limit: int
+) -> list[CourseRoster]:
+    """Lock up to `limit` rosters synced before the given time, skipping locked ones."""
+    return list(
+        await db.scalars(
+            select(CourseRoster)
+            .where(CourseRoster.synced_at < synced_before)
+            .order_by(CourseRoster.synced_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+    )
+
+
+async def save_roster(
+    db: AsyncSession, course_id: str, kind: str, user_ids: list[str]
+) -> None:
+    """Replace a roster and commit. If another worker saved it concurrently, theirs is kept."""
+    try:
+        await replace_roster(db, course_id, kind, user_ids)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
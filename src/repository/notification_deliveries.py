@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import Dict, Optional, Set
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.db import insert_ignoring_conflicts
+from src.model.notification_delivery import NotificationDelivery
+
+
+async def get_delivered_channels(
+    db: AsyncSession, event_id: str, recipients: list[str]
+) -> Dict[str, Set[str]]:
+    """Channels each recipient already got the event on, in a single query."""
+    delivered: Dict[str, Set[str]] = {}
+    if not recipients:
+        return delivered
+    result = await db.execute(
+        select(NotificationDelivery.recipient, NotificationDelivery.channel).where(
+            NotificationDelivery.event_id == event_id,
+            NotificationDelivery.recipient.in_(recipients),
+        )
+    )
+    for recipient, channel in result.all():
+        delivered.setdefault(recipient, set()).add(channel)
+    return delivered
+
+
+async def add_deliveries(db: AsyncSession, rows: list[dict]) -> None:
+    """
+    Insert every row in a single bulk INSERT, ignoring the ones already
+    recorded, so a retried fan-out can write its deliveries again.
+    """
+    if not rows:
+        return
+    await db.execute(insert_ignoring_conflicts(db, NotificationDelivery), rows)
+    await db.commit()
+
+
+async def get_user_deliveries(
+    db: AsyncSession,
+    recipient: str,
+    limit: int = 50,
+    before: Optional[datetime] = None,
+) -> list[NotificationDelivery]:
+    """A user's delivery history, newest first."""
+    query = select(NotificationDelivery).where(
+        NotificationDelivery.recipient == recipient
+    )
+    if before is not None:
+        query = query.where(NotificationDelivery.sent_at < before)
+    return list(
+        await db.scalars(
+            query.order_by(NotificationDelivery.sent_at.desc()).limit(limit)
+        )
+    )
+
+
+async def delete_deliveries_before(db: AsyncSession, before: datetime) -> int:
+    """Delete every delivery recorded before the given time. Returns how many."""
+    result = await db.execute(
+        delete(NotificationDelivery).where(NotificationDelivery.sent_at < before)
+    )
+    await db.commit()
+    return result.rowcount
@@ -1,12 +1,33 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.model.notification_preferences import NotificationPreferences
+from src.utils.metrics import PREFERENCE_LOOKUP_DURATION
 
 
-def get_preferences_by_user_id(
-    db: Session, user_id: str
+async def get_preferences_by_user_id(
+    db: AsyncSession, user_id: str
 ) -> list[NotificationPreferences]:
-    return (
-        db.query(NotificationPreferences)
-        .filter(NotificationPreferences.uid == user_id)
-        .all()
-    )
+    with PREFERENCE_LOOKUP_DURATION.labels("single").time():
+        result = await db.scalars(
+            select(NotificationPreferences).where(
+                NotificationPreferences.uid == user_id
+            )
+        )
+        return list(result)
+
+
+async def get_preferences_by_user_ids(
+    db: AsyncSession, user_ids: list[str], event_type: str
+) -> dict[str, NotificationPreferences]:
+    """Load the preference for event_type of every given user in a single query."""
+    if not user_ids:
+        return {}
+
+    with PREFERENCE_LOOKUP_DURATION.labels("bulk").time():
+        preferences = await db.scalars(
+            select(NotificationPreferences).where(
+                NotificationPreferences.uid.in_(set(user_ids)),
+                NotificationPreferences.event_type == event_type,
+            )
+        )
+    return {pref.uid: pref for pref in preferences}
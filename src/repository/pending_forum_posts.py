@@ -0,0 +1,56 @@
+from datetime import datetime
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from src.database.db import insert_ignoring_conflicts
+from src.model.pending_forum_post import PendingForumPost
+
+
+async def add_pending_forum_post(db: AsyncSession, row: dict) -> None:
+    """Store a post, ignoring it if it is already waiting."""
+    await db.execute(insert_ignoring_conflicts(db, PendingForumPost), [row])
+    await db.commit()
+
+
+async def claim_pending_forum_posts(
+    db: AsyncSession, received_before: datetime, limit: int
+) -> list[PendingForumPost]:
+    """
+    Lock every pending post of up to `limit` courses whose oldest post arrived
+    before `received_before`. A course is claimed through the lock on its
+    oldest row, skipping courses another worker holds, so a course's posts
+    are never split between workers. The locks last until the session commits.
+    """
+    other = aliased(PendingForumPost)
+    oldest = (
+        select(PendingForumPost.course_id)
+        .where(
+            PendingForumPost.received_at < received_before,
+            ~select(other.id)
+            .where(
+                other.course_id == PendingForumPost.course_id,
+                other.id < PendingForumPost.id,
+            )
+            .exists(),
+        )
+        .order_by(PendingForumPost.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    course_ids = list(await db.scalars(oldest))
+    if not course_ids:
+        return []
+    return list(
+        await db.scalars(
+            select(PendingForumPost)
+            .where(PendingForumPost.course_id.in_(course_ids))
+            .order_by(PendingForumPost.course_id, PendingForumPost.post_created_at)
+            .with_for_update()
+        )
+    )
+
+
+async def delete_pending_forum_posts(db: AsyncSession, ids: list[int]) -> None:
+    """Delete every given row in a single bulk DELETE."""
+    if ids:
+        await db.execute(delete(PendingForumPost).where(PendingForumPost.id.in_(ids)))
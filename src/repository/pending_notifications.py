@@ -0,0 +1,71 @@
+from datetime import datetime
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from src.model.pending_notification import PendingNotification
+
+
+async def add_pending_notifications(db: AsyncSession, rows: list[dict]) -> None:
+    """Insert every row in a single bulk INSERT."""
+    if not rows:
+        return
+    await db.execute(insert(PendingNotification), rows)
+    await db.commit()
+
+
+async def claim_pending_notifications(
+    db: AsyncSession,
+    frequency: str,
+    created_before: datetime,
+    after_uid: str,
+    limit: int,
+) -> list[PendingNotification]:
+    """
+    Lock every pending notification of the given frequency created before
+    `created_before` for up to `limit` users, in uid order after `after_uid`.
+    A user is claimed through the lock on their oldest row, skipping users
+    another worker holds, so a user's notifications are never split between
+    digests. The locks last until the session commits.
+    """
+    other = aliased(PendingNotification)
+    oldest = (
+        select(PendingNotification.uid)
+        .where(
+            PendingNotification.frequency == frequency,
+            PendingNotification.created_at < created_before,
+            PendingNotification.uid > after_uid,
+            ~select(other.id)
+            .where(
+                other.frequency == frequency,
+                other.uid == PendingNotification.uid,
+                other.id < PendingNotification.id,
+            )
+            .exists(),
+        )
+        .order_by(PendingNotification.uid)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    uids = list(await db.scalars(oldest))
+    if not uids:
+        return []
+    return list(
+        await db.scalars(
+            select(PendingNotification)
+            .where(
+                PendingNotification.frequency == frequency,
+                PendingNotification.created_at < created_before,
+                PendingNotification.uid.in_(uids),
+            )
+            .order_by(PendingNotification.uid, PendingNotification.id)
+            .with_for_update()
+        )
+    )
+
+
+async def delete_pending_notifications(db: AsyncSession, ids: list[int]) -> None:
+    """Delete every given row in a single bulk DELETE."""
+    if ids:
+        await db.execute(
+            delete(PendingNotification).where(PendingNotification.id.in_(ids))
+        )
@@ -1,7 +1,9 @@
 from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel, Field
-from typing import Dict, Any
+from pydantic import Field
+from src.notifications.templates import EMAIL_DEFAULT_LOCALE
+from src.schemas.base_event import BaseEvent, format_date
+from typing import Dict, Any, Literal
 
 
 class AssignmentEventType(Enum):
@@ -10,49 +12,27 @@ class AssignmentEventType(Enum):
     # Add more event types as needed
 
 
-class AssignmentEvent(BaseModel):
+class AssignmentEvent(BaseEvent):
     event_type: str
     course_id: str
     assignment_id: str
     assignment_title: str
     assignment_due_date: datetime
 
-    def get_email_data(self) -> Dict[str, Any]:
-        """Base method that should be overridden by subclasses."""
-        raise NotImplementedError("Subclasses must implement get_email_data")
+    def template_context(self, locale: str = EMAIL_DEFAULT_LOCALE) -> Dict[str, Any]:
+        return {
+            "assignment_title": self.assignment_title,
+            "due_date": format_date(self.assignment_due_date),
+        }
 
 
 class AssignmentReminder(AssignmentEvent):
-    event_type: str = Field(default=AssignmentEventType.ASSIGNMENT_REMINDER.value)
-
-    def get_email_data(self) -> Dict[str, Any]:
-        """Send email notification for assignment reminder."""
-        return {
-            "subject": f"Recordatorio de asignación: {self.assignment_title}",
-            "content": f"""
-            Recordatorio: Tienes una asignación próxima a vencer.
-            
-            Título: {self.assignment_title}
-            Fecha de entrega: {self.assignment_due_date.strftime('%d/%m/%Y %H:%M')}
-            
-            ¡Asegúrate de completarla antes de la fecha límite!
-            """,
-        }
+    event_type: Literal[AssignmentEventType.ASSIGNMENT_REMINDER.value] = Field(
+        default=AssignmentEventType.ASSIGNMENT_REMINDER.value
+    )
 
 
 class AssignmentCreated(AssignmentEvent):
-    event_type: str = Field(default=AssignmentEventType.ASSIGNMENT_CREATED.value)
-
-    def get_email_data(self) -> Dict[str, Any]:
-        """Send email notification for assignment created."""
-        return {
-            "subject": f"Nueva asignación: {self.assignment_title}",
-            "content": f"""
-            Se ha creado una nueva asignación en tu curso.
-            
-            Título: {self.assignment_title}
-            Fecha de entrega: {self.assignment_due_date.strftime('%d/%m/%Y %H:%M')}
-            
-            ¡No olvides completarla a tiempo!
-            """,
-        }
+    event_type: Literal[AssignmentEventType.ASSIGNMENT_CREATED.value] = Field(
+        default=AssignmentEventType.ASSIGNMENT_CREATED.value
+    )
@@ -1,6 +1,56 @@
-from pydantic import BaseModel
-from typing import Literal
+from datetime import datetime
+from pydantic import BaseModel, PrivateAttr
+from typing import Any, Dict, Optional
+from src.notifications.templates import (
+    EMAIL_DEFAULT_LOCALE,
+    RenderedEmail,
+    get_template,
+    resolve_locale,
+)
+
+
+def format_date(value: datetime) -> str:
+    return value.strftime("%d/%m/%Y %H:%M")
+
+
+def excerpt(text: str, length: int = 100) -> str:
+    return text[:length] + ("..." if len(text) > length else "")
 
 
 class BaseEvent(BaseModel):
     event_type: str
+
+    # Emails rendered for this event, per locale
+    _rendered_emails: Dict[str, RenderedEmail] = PrivateAttr(default_factory=dict)
+
+    def template_name(self) -> str:
+        """Name of the email template of this event, its event type by default."""
+        return self.event_type
+
+    def template_context(self, locale: str = EMAIL_DEFAULT_LOCALE) -> Dict[str, Any]:
+        """Values the email template of this event is rendered with in a locale."""
+        return self.model_dump()
+
+    def render_email(self, locale: Optional[str] = None) -> RenderedEmail:
+        """
+        Render the email of this event. The result is cached on the event, so
+        every recipient of a fan-out shares one rendering.
+        """
+        locale = locale or EMAIL_DEFAULT_LOCALE
+        rendered = self._rendered_emails.get(locale)
+        if rendered is None:
+            # The context follows the template's locale, which may be a fallback
+            template_locale = resolve_locale(self.template_name(), locale)
+            template = get_template(self.template_name(), template_locale)
+            rendered = template.render(self.template_context(template_locale))
+            self._rendered_emails[locale] = rendered
+        return rendered
+
+    def get_email_data(self) -> Dict[str, Any]:
+        """Subject and content of the notification email, in the default locale."""
+        rendered = self.render_email()
+        return {
+            "subject": rendered.subject,
+            "content": rendered.text,
+            "html": rendered.html,
+        }
@@ -0,0 +1,28 @@
+from pydantic import Field
+from src.schemas.assignment_event import AssignmentCreated, AssignmentReminder
+from src.schemas.base_event import BaseEvent
+from typing import Annotated, List, Literal, Optional, Union
+
+
+class FanoutEventType:
+    FANOUT_CHUNK = "fanout.chunk"
+
+
+class FanoutChunk(BaseEvent):
+    """
+    A slice of the recipients of a course-wide event, published back to the
+    exchange so any worker can notify it.
+    """
+
+    event_type: Literal[FanoutEventType.FANOUT_CHUNK] = Field(
+        default=FanoutEventType.FANOUT_CHUNK
+    )
+    # Id of the original event, which keys the send-log of every chunk
+    parent_event_id: Optional[str] = None
+    chunk_index: int
+    chunk_count: int
+    recipients: List[str]
+    event: Annotated[
+        Union[AssignmentCreated, AssignmentReminder],
+        Field(discriminator="event_type"),
+    ]
@@ -1,7 +1,8 @@
 from datetime import datetime
-from pydantic import BaseModel, Field
-from src.schemas.base_event import BaseEvent
-from typing import Dict, Any
+from pydantic import Field
+from src.notifications.templates import EMAIL_DEFAULT_LOCALE
+from src.schemas.base_event import BaseEvent, format_date
+from typing import Dict, Any, Literal
 
 
 class FeedbackEventType:
@@ -9,7 +10,9 @@ class FeedbackEventType:
 
 
 class FeedbackCreatedEvent(BaseEvent):
-    event_type: str = Field(default=FeedbackEventType.FEEDBACK_CREATED)
+    event_type: Literal[FeedbackEventType.FEEDBACK_CREATED] = Field(
+        default=FeedbackEventType.FEEDBACK_CREATED
+    )
     course_id: str
     student_id: str
     feedback_id: str
@@ -17,18 +20,10 @@ class FeedbackCreatedEvent(BaseEvent):
     feedback_rating: int
     feedback_created_at: datetime
 
-    def get_email_data(self) -> Dict[str, Any]:
-        """Send email notification for feedback created."""
+    def template_context(self, locale: str = EMAIL_DEFAULT_LOCALE) -> Dict[str, Any]:
         return {
-            "subject": f"Nuevo feedback recibido",
-            "content": f"""
-            Has recibido nuevo feedback de tu profesor.
-            
-            Curso ID: {self.course_id}
-            Calificación: {self.feedback_rating}/5
-            Comentario: {self.feedback_text}
-            Fecha: {self.feedback_created_at.strftime('%d/%m/%Y %H:%M')}
-            
-            ¡Revisa el feedback para mejorar tu desempeño!
-            """,
+            "course_id": self.course_id,
+            "feedback_rating": self.feedback_rating,
+            "feedback_text": self.feedback_text,
+            "created_at": format_date(self.feedback_created_at),
         }
@@ -1,7 +1,9 @@
+import html
 from datetime import datetime
-from pydantic import BaseModel, Field
-from src.schemas.base_event import BaseEvent
-from typing import Dict, Any
+from pydantic import Field
+from src.notifications.templates import EMAIL_DEFAULT_LOCALE, SafeHtml
+from src.schemas.base_event import BaseEvent, excerpt, format_date
+from typing import Dict, Any, List, Literal
 
 
 class ForumEventType:
@@ -9,24 +11,53 @@ class ForumEventType:
 
 
 class ForumActivityEvent(BaseEvent):
-    event_type: str = Field(default=ForumEventType.FORUM_ACTIVITY)
+    event_type: Literal[ForumEventType.FORUM_ACTIVITY] = Field(
+        default=ForumEventType.FORUM_ACTIVITY
+    )
     course_id: str
     student_id: str
     post_id: str
     post_text: str
     post_created_at: datetime
 
-    def get_email_data(self) -> Dict[str, Any]:
-        """Send email notification for forum activity."""
+    def template_context(self, locale: str = EMAIL_DEFAULT_LOCALE) -> Dict[str, Any]:
+        return {
+            "course_id": self.course_id,
+            "post_excerpt": excerpt(self.post_text),
+            "created_at": format_date(self.post_created_at),
+        }
+
+
+class ForumActivityDigest(BaseEvent):
+    """Several forum.activity events of one course, notified as a single message."""
+
+    event_type: str = Field(default=ForumEventType.FORUM_ACTIVITY)
+    course_id: str
+    posts: List[ForumActivityEvent]
+
+    def template_name(self) -> str:
+        # A single post reads like the event itself
+        if len(self.posts) == 1:
+            return ForumEventType.FORUM_ACTIVITY
+        return "forum.activity.digest"
+
+    def template_context(self, locale: str = EMAIL_DEFAULT_LOCALE) -> Dict[str, Any]:
+        if len(self.posts) == 1:
+            return self.posts[0].template_context(locale)
+
+        lines = [
+            (excerpt(post.post_text), format_date(post.post_created_at))
+            for post in self.posts
+        ]
         return {
-            "subject": f"Nueva actividad en el foro",
-            "content": f"""
-            Hay nueva actividad en el foro de tu curso.
-            
-            Curso ID: {self.course_id}
-            Post: {self.post_text[:100]}{'...' if len(self.post_text) > 100 else ''}
-            Fecha: {self.post_created_at.strftime('%d/%m/%Y %H:%M')}
-            
-            ¡Participa en la discusión!
-            """,
+            "course_id": self.course_id,
+            "post_count": len(self.posts),
+            "posts": "\n".join(f"- {text} ({date})" for text, date in lines),
+            "posts_html": SafeHtml(
+                "<ul>"
+                + "".join(
+                    f"<li>{html.escape(text)} ({date})</li>" for text, date in lines
+                )
+                + "</ul>"
+            ),
         }
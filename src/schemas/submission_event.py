@@ -1,7 +1,8 @@
 from datetime import datetime
-from typing import Optional, Dict, Any
-from pydantic import BaseModel, Field
-from src.schemas.base_event import BaseEvent
+from typing import Optional, Dict, Any, Literal
+from pydantic import Field
+from src.notifications.templates import EMAIL_DEFAULT_LOCALE, SUBMISSION_TEXTS
+from src.schemas.base_event import BaseEvent, format_date
 
 
 class SubmissionEventType:
@@ -9,7 +10,9 @@ class SubmissionEventType:
 
 
 class SubmissionCorrectedEvent(BaseEvent):
-    event_type: str = Field(default=SubmissionEventType.SUBMISSION_CORRECTED)
+    event_type: Literal[SubmissionEventType.SUBMISSION_CORRECTED] = Field(
+        default=SubmissionEventType.SUBMISSION_CORRECTED
+    )
     course_id: str
     assignment_id: str
     submission_id: str
@@ -20,29 +23,21 @@ class SubmissionCorrectedEvent(BaseEvent):
     needs_manual_review: bool
     corrected_at: datetime
 
-    def get_email_data(self) -> Dict[str, Any]:
-        """Send email notification for submission corrected."""
-        score_text = (
-            f"Puntuación: {self.score}" if self.score is not None else "Sin puntuación"
-        )
-        review_text = (
-            "Necesita revisión manual"
-            if self.needs_manual_review
-            else "Corrección automática"
-        )
-
+    def template_context(self, locale: str = EMAIL_DEFAULT_LOCALE) -> Dict[str, Any]:
+        texts = SUBMISSION_TEXTS[locale]
         return {
-            "subject": f"Tu entrega ha sido corregida",
-            "content": f"""
-            Tu entrega ha sido corregida.
-            
-            Curso ID: {self.course_id}
-            Asignación ID: {self.assignment_id}
-            {score_text}
-            Tipo de corrección: {review_text}
-            Feedback: {self.feedback}
-            Fecha de corrección: {self.corrected_at.strftime('%d/%m/%Y %H:%M')}
-            
-            ¡Revisa los resultados!
-            """,
+            "course_id": self.course_id,
+            "assignment_id": self.assignment_id,
+            "score_text": (
+                texts["score"].format(score=self.score)
+                if self.score is not None
+                else texts["no_score"]
+            ),
+            "review_text": (
+                texts["manual_review"]
+                if self.needs_manual_review
+                else texts["automatic"]
+            ),
+            "feedback": self.feedback,
+            "corrected_at": format_date(self.corrected_at),
         }
@@ -0,0 +1,160 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+from typing import Dict
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _worker_count() -> int:
+    workers = os.getenv("EVENTS_WORKERS", "1")
+    if workers == "auto":
+        return len(os.sched_getaffinity(0))
+    return int(workers)
+
+
+# Worker processes to run, "auto" uses one per available CPU
+EVENTS_WORKERS = _worker_count()
+# Seconds to wait before restarting a worker that exited
+EVENTS_WORKER_RESTART_DELAY = float(os.getenv("EVENTS_WORKER_RESTART_DELAY", "1"))
+# Seconds workers get to finish in-flight events on shutdown before being killed
+EVENTS_SHUTDOWN_TIMEOUT = float(os.getenv("EVENTS_SHUTDOWN_TIMEOUT", "60"))
+
+
+async def _prepare_database() -> None:
+    from src.database.db import add_missing_columns, create_tables, engine
+    from src.model.course_roster import CourseRoster, CourseRosterMember
+    from src.model.notification_delivery import NotificationDelivery
+    from src.model.notification_preferences import NotificationPreferences
+    from src.model.pending_forum_post import PendingForumPost
+    from src.model.pending_notification import PendingNotification
+
+    try:
+        # Tables owned by this service
+        await create_tables(
+            PendingNotification,
+            PendingForumPost,
+            CourseRoster,
+            CourseRosterMember,
+            NotificationDelivery,
+        )
+        # Columns this service added to tables it only reads
+        await add_missing_columns(NotificationPreferences, "digest_frequency")
+    finally:
+        await engine.dispose()
+
+
+def prepare_database() -> None:
+    """
+    Create this service's tables and columns once, before any worker starts,
+    so workers never run DDL at the same time.
+    """
+    asyncio.run(_prepare_database())
+
+
+async def _serve() -> None:
+    # Imported here so each worker process builds its own DB engine and
+    # broker connection instead of inheriting the supervisor's
+    from src.consumers.event_router import EventRouter
+    from src.database.db import engine
+    from src.handlers.purge_delivery_log import run_delivery_log_purger
+    from src.handlers.reconcile_rosters import run_roster_reconciler
+    from src.handlers.send_forum_notifications import run_forum_digest_sender
+    from src.handlers.send_digest_notifications import run_digest_scheduler
+
+    router = EventRouter()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(router.stop()))
+
+    background_tasks = [
+        asyncio.create_task(run_digest_scheduler()),
+        asyncio.create_task(run_roster_reconciler()),
+        asyncio.create_task(run_delivery_log_purger()),
+        asyncio.create_task(run_forum_digest_sender()),
+    ]
+    try:
+        await router.start()
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await engine.dispose()
+
+
+def run_worker(worker_index: int = 0) -> None:
+    """Run one EventRouter until SIGTERM/SIGINT, draining in-flight events."""
+    from src.utils.metrics import start_metrics_server
+    from src.utils.tracing import setup_tracing, shutdown_tracing
+
+    start_metrics_server(worker_index)
+    setup_tracing(worker_index)
+    try:
+        asyncio.run(_serve())
+    finally:
+        shutdown_tracing()
+
+
+class Supervisor:
+    """
+    Runs N worker processes, each with its own broker connection and DB engine,
+    and restarts them when they exit. On SIGTERM/SIGINT the signal is forwarded
+    so workers stop consuming and finish their in-flight events.
+    """
+
+    def __init__(self, workers: int = EVENTS_WORKERS):
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._stopping = False
+
+    def _spawn(self, index: int) -> None:
+        process = self._context.Process(
+            target=run_worker, args=(index,), name=f"events-worker-{index}"
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info("Started %s (pid %s)", process.name, process.pid)
+
+    def _handle_stop(self, signum, frame) -> None:
+        logger.info("Received signal %s, shutting down workers", signum)
+        self._stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while not self._stopping:
+            wait([p.sentinel for p in self._processes.values()], timeout=1)
+            for index, process in list(self._processes.items()):
+                if self._stopping or process.is_alive():
+                    continue
+                logger.warning(
+                    "%s exited with code %s, restarting", process.name, process.exitcode
+                )
+                time.sleep(EVENTS_WORKER_RESTART_DELAY)
+                if not self._stopping:
+                    self._spawn(index)
+
+        self._shutdown()
+
+    def _shutdown(self) -> None:
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + EVENTS_SHUTDOWN_TIMEOUT
+        for process in self._processes.values():
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("%s did not stop in time, killing it", process.name)
+                process.kill()
+                process.join()
+        logger.info("All workers stopped")
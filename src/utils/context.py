@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+# Event and recipient being processed by the current task. asyncio copies
+# the context into every task it creates, so the recipients of a fan-out
+# see the event of their parent task.
+event_id_var: ContextVar[Optional[str]] = ContextVar("event_id", default=None)
+event_type_var: ContextVar[Optional[str]] = ContextVar("event_type", default=None)
+recipient_var: ContextVar[Optional[str]] = ContextVar("recipient", default=None)
+# Lane whose queue the current event was consumed from
+lane_var: ContextVar[Optional[str]] = ContextVar("lane", default=None)
+
+
+@contextmanager
+def event_context(
+    event_id: Optional[str], event_type: Optional[str] = None
+) -> Iterator[None]:
+    """Tag everything logged inside the block with the given event."""
+    id_token = event_id_var.set(event_id)
+    type_token = event_type_var.set(event_type)
+    try:
+        yield
+    finally:
+        event_type_var.reset(type_token)
+        event_id_var.reset(id_token)
+
+
+def set_event_type(event_type: str) -> None:
+    """Set the event type once the message was decoded."""
+    event_type_var.set(event_type)
+
+
+@contextmanager
+def lane_context(lane: Optional[str]) -> Iterator[None]:
+    """Run the block as part of the given lane."""
+    token = lane_var.set(lane)
+    try:
+        yield
+    finally:
+        lane_var.reset(token)
+
+
+@contextmanager
+def recipient_context(recipient) -> Iterator[None]:
+    """Tag everything logged inside the block with the given recipient."""
+    token = recipient_var.set(str(recipient))
+    try:
+        yield
+    finally:
+        recipient_var.reset(token)
+
+
+def log_context() -> Dict[str, str]:
+    """Fields of the current event/recipient that are set."""
+    fields = {
+        "event_id": event_id_var.get(),
+        "event_type": event_type_var.get(),
+        "lane": lane_var.get(),
+        "recipient": recipient_var.get(),
+    }
+    return {key: value for key, value in fields.items() if value is not None}
@@ -0,0 +1,151 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, TypeVar
+from src.utils.context import lane_var, recipient_context
+from src.utils.logger import setup_logger
+from src.utils.metrics import FANOUT_RECIPIENTS, FANOUT_SIZE, RECIPIENTS_IN_FLIGHT
+from src.utils.tracing import tracer
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+# Recipients of a single event processed at the same time
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "20"))
+
+# Limits per downstream service and per channel, held separately by each
+# lane so single-recipient events never wait for slots taken by fan-outs.
+# Each one can be overridden with FANOUT_LIMIT_<NAME>, e.g. FANOUT_LIMIT_EMAIL=2,
+# or for one lane with FANOUT_LIMIT_<LANE>_<NAME>. "recipients" bounds the
+# recipients of every event of the lane in flight at the same time.
+DEFAULT_LIMITS = {
+    "recipients": 200,
+    "courses": 10,
+    "users": 20,
+    "tokens": 20,
+    "email": 5,
+    "push": 20,
+}
+
+_limiters: Dict[str, asyncio.Semaphore] = {}
+
+
+class NotificationOutcome(Enum):
+    SENT = "sent"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+    # Only a push queued on a dispatcher, known once it is flushed
+    QUEUED = "queued"
+
+
+@dataclass
+class FanoutSummary:
+    event_type: str = "unknown"
+    sent: int = 0
+    skipped: int = 0
+    failed: int = 0
+    # Exceptions raised while notifying recipients, counted as failed
+    errors: List[Exception] = field(default_factory=list)
+    # Recipients whose outcome is their queued push, see settle_queued
+    queued: Set = field(default_factory=set)
+
+    @property
+    def total(self) -> int:
+        return self.sent + self.skipped + self.failed + len(self.queued)
+
+    def record(self, outcome: NotificationOutcome, recipient=None) -> None:
+        if outcome == NotificationOutcome.QUEUED:
+            self.queued.add(recipient)
+            return
+        if outcome == NotificationOutcome.SENT:
+            self.sent += 1
+        elif outcome == NotificationOutcome.SKIPPED:
+            self.skipped += 1
+        else:
+            self.failed += 1
+        FANOUT_RECIPIENTS.labels(self.event_type, outcome.value).inc()
+
+    def settle_queued(self, pushed: Set) -> None:
+        """Count the queued recipients as sent if their push reached them."""
+        queued, self.queued = self.queued, set()
+        for recipient in queued:
+            self.record(
+                NotificationOutcome.SENT
+                if recipient in pushed
+                else NotificationOutcome.FAILED
+            )
+
+    def __str__(self) -> str:
+        return f"sent={self.sent} skipped={self.skipped} failed={self.failed}"
+
+
+def get_limit(name: str, lane: Optional[str] = None) -> int:
+    """Configured concurrency limit for a downstream service or channel."""
+    default = os.getenv(
+        f"FANOUT_LIMIT_{name.upper()}",
+        str(DEFAULT_LIMITS.get(name, FANOUT_CONCURRENCY)),
+    )
+    if lane is None:
+        return int(default)
+    return int(os.getenv(f"FANOUT_LIMIT_{lane.upper()}_{name.upper()}", default))
+
+
+@asynccontextmanager
+async def limit(name: str):
+    """Hold one slot of the limit for the given service or channel in the current lane."""
+    lane = lane_var.get()
+    key = name if lane is None else f"{lane}.{name}"
+    semaphore = _limiters.get(key)
+    if semaphore is None:
+        semaphore = _limiters[key] = asyncio.Semaphore(get_limit(name, lane))
+    async with semaphore:
+        yield
+
+
+async def fan_out(
+    recipients: Iterable[T],
+    notify: Callable[[T], Awaitable[NotificationOutcome]],
+    concurrency: int = FANOUT_CONCURRENCY,
+    event_type: str = "unknown",
+) -> FanoutSummary:
+    """
+    Run notify for every recipient concurrently, at most `concurrency` at a time
+    and within the lane's "recipients" limit shared by every event.
+
+    Args:
+        recipients: Items to notify (user IDs, enrollments, ...)
+        notify: Coroutine function that notifies one recipient and reports the outcome
+        concurrency: Maximum number of recipients processed at the same time
+        event_type: Event type the fan-out metrics are labelled with
+
+    Returns:
+        FanoutSummary: How many recipients were sent, skipped and failed; the
+            ones left queued are settled when their pushes are flushed
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    summary = FanoutSummary(event_type)
+
+    async def run(recipient: T) -> None:
+        async with semaphore, limit("recipients"):
+            with RECIPIENTS_IN_FLIGHT.track_inprogress(), recipient_context(
+                recipient
+            ), tracer.start_as_current_span(
+                "notify recipient", attributes={"recipient": str(recipient)}
+            ) as span:
+                try:
+                    outcome = await notify(recipient)
+                except Exception as e:
+                    logger.error("Error notifying recipient %s: %s", recipient, e)
+                    span.record_exception(e)
+                    summary.errors.append(e)
+                    outcome = NotificationOutcome.FAILED
+                span.set_attribute("outcome", outcome.value)
+        summary.record(outcome, recipient)
+
+    recipients = list(recipients)
+    FANOUT_SIZE.labels(event_type).observe(len(recipients))
+    await asyncio.gather(*(run(recipient) for recipient in recipients))
+    return summary
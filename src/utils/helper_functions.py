@@ -1,81 +1,282 @@
+import os
 import httpx
-from typing import List, Dict, Optional, Any
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.clients.http import get_client, is_transient
+from src.model.notification_delivery import DeliveryChannel
+from src.model.notification_preferences import DigestFrequency, NotificationPreferences
 from src.repository.notifications_preferences import get_preferences_by_user_id
-from src.utils.logger import setup_logger
-from notifications.email import send_notification_email
-from notifications.push import send_push_to_token, get_user_fcm_tokens
-from utils.result import Success
+from src.utils.cache import MISSING, TTLCache
+from src.utils.logger import SAMPLED, setup_logger
+from src.utils.metrics import UPSTREAM_REQUEST_DURATION
+from src.utils.fanout import FanoutSummary, NotificationOutcome, limit
+from src.notifications.delivery_log import DeliveryLog
+from src.notifications.digest import DigestBuffer
+from src.notifications.email import is_transient_smtp_error, send_rendered_email
+from src.notifications.push import (
+    PushDispatcher,
+    get_user_fcm_tokens,
+    has_push_notification,
+    is_transient_push_error,
+)
+from src.utils.result import Success
 
 logger = setup_logger(__name__)
 
+user_email_cache = TTLCache(
+    "user_email",
+    maxsize=int(os.getenv("USER_EMAIL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_EMAIL_CACHE_TTL", "600")),
+    negative_ttl=float(os.getenv("USER_EMAIL_CACHE_NEGATIVE_TTL", "60")),
+)
+
 
 async def get_user_email(user_id: str) -> Optional[str]:
-    """Fetch user email from users service."""
+    """
+    Fetch user email from users service, going through the email cache.
+    Returns None for an unknown user; any other failure is raised, so the
+    recipient counts as failed and transient errors retry the event.
+    """
+    cached = user_email_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+
     try:
-        async with httpx.AsyncClient() as client:
-            user_response = await client.get(
-                f"https://users-service-production-968d.up.railway.app/users/{user_id}"
-            )
-            user_response.raise_for_status()
-            user_data = user_response.json()["data"]
-            return user_data["email"]
+        async with limit("users"):
+            with UPSTREAM_REQUEST_DURATION.labels("users", "get_user").time():
+                user_response = await get_client("users").get(f"/users/{user_id}")
+        user_response.raise_for_status()
+        user_data = user_response.json()["data"]
+        user_email_cache.set(user_id, user_data["email"])
+        return user_data["email"]
     except Exception as e:
-        logger.error(f"Could not get user information for {user_id}: {e}")
-        return None
+        logger.error("Could not get user information for %s: %s", user_id, e)
+        if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
+            user_email_cache.set_negative(user_id)
+            return None
+        raise
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether a notification failed for a reason worth retrying the event for."""
+    return (
+        is_transient(error)
+        or is_transient_smtp_error(error)
+        or is_transient_push_error(error)
+    )
+
+
+def raise_transient_failure(summary: FanoutSummary) -> None:
+    """
+    Raise the first transient error of a fan-out, once its deliveries are
+    recorded, so the event is retried and the send-log skips whoever got it.
+    """
+    for error in summary.errors:
+        if is_transient_error(error):
+            raise error
 
 
 async def send_email_notification(user_email: str, event) -> bool:
-    """Send email notification to user using the event's send_email_notification method."""
+    """Send the event's email to a user. Transient SMTP failures are raised."""
     try:
-        email_data = event.get_email_data()
-        result = await send_notification_email(
-            user_email, email_data["subject"], email_data["content"]
-        )
-        if isinstance(result, Success):
-            logger.info(f"Email successfully sent to {user_email}")
-            return True
-        else:
-            logger.error(f"Error sending email to {user_email}: {result.error}")
-            return False
+        # Rendered once per event and shared by every recipient
+        rendered = event.render_email()
+        async with limit("email"):
+            result = await send_rendered_email(user_email, rendered)
     except Exception as e:
-        logger.error(f"Failed to send email notification: {e}")
+        logger.error("Failed to send email notification: %s", e)
         return False
+    if isinstance(result, Success):
+        logger.info("Email successfully sent to %s", user_email, extra=SAMPLED)
+        return True
+    logger.error("Error sending email to %s: %s", user_email, result.error)
+    if is_transient_smtp_error(result.error):
+        raise result.error
+    return False
 
 
 async def send_notifications_based_on_preferences(
-    user_id: str, event, email_enabled: bool, push_enabled: bool
-) -> None:
-    
+    user_id: str,
+    event,
+    email_enabled: bool,
+    push_enabled: bool,
+    push_dispatcher: Optional[PushDispatcher] = None,
+    delivery_log: Optional[DeliveryLog] = None,
+) -> NotificationOutcome:
+    """
+    Send the event to the user over the enabled channels.
+    Returns SENT if any channel delivered, FAILED if every attempt failed
+    and SKIPPED if there was nothing to send to.
+
+    When a push_dispatcher is given, the user's tokens are queued on it and the
+    caller flushes it once for all recipients; if nothing else was delivered the
+    outcome is QUEUED and settled by flush_fan_out.
+
+    With a delivery_log, channels that already delivered the event are skipped
+    and emails sent are recorded; queued pushes are recorded by the caller
+    once flushed, see flush_fan_out.
+    """
+    attempted = False
+    delivered = False
+    queued = False
+    # A transient failure of either channel is raised once both were tried,
+    # so the event is retried for this user
+    error: Optional[Exception] = None
+
+    if delivery_log is not None:
+        if email_enabled and delivery_log.delivered(user_id, DeliveryChannel.EMAIL):
+            email_enabled = False
+            logger.info("Email already sent to %s", user_id, extra=SAMPLED)
+        if push_enabled and delivery_log.delivered(user_id, DeliveryChannel.PUSH):
+            push_enabled = False
+            logger.info("Push already sent to %s", user_id, extra=SAMPLED)
+    if push_enabled and not has_push_notification(event):
+        push_enabled = False
+
     if email_enabled:
-        user_email = await get_user_email(user_id)
-        if user_email:
-            await send_email_notification(user_email, event)
+        try:
+            user_email = await get_user_email(user_id)
+            if user_email:
+                attempted = True
+                delivered = await send_email_notification(user_email, event)
+                if delivered and delivery_log is not None:
+                    await delivery_log.record(user_id, DeliveryChannel.EMAIL)
+            else:
+                logger.info("No email found for user %s", user_id, extra=SAMPLED)
+        except Exception as e:
+            attempted = True
+            if is_transient_error(e):
+                error = e
 
     if push_enabled:
-        fcm_tokens = await get_user_fcm_tokens(user_id)
-
-        if not fcm_tokens:
-            logger.info(f"No FCM tokens found for user {user_id}")
-            return
+        try:
+            fcm_tokens = await get_user_fcm_tokens(user_id)
+        except Exception as e:
+            attempted = True
+            if is_transient_error(e):
+                error = error or e
+        else:
+            if not fcm_tokens:
+                logger.info("No FCM tokens found for user %s", user_id, extra=SAMPLED)
+            elif push_dispatcher is not None:
+                attempted = True
+                queued = True
+                push_dispatcher.add(user_id, fcm_tokens)
+            else:
+                # Send push notification to all user's devices
+                attempted = True
+                dispatcher = PushDispatcher(event)
+                dispatcher.add(user_id, fcm_tokens)
+                pushed = user_id in await dispatcher.flush()
+                if pushed and delivery_log is not None:
+                    await delivery_log.record(user_id, DeliveryChannel.PUSH)
+                delivered = pushed or delivered
+                if dispatcher.errors:
+                    error = error or dispatcher.errors[0]
 
-        # Send push notification to all user's devices
-        for token in fcm_tokens:
-            await send_push_to_token(token, event)
+    if error is not None:
+        raise error
+    if not attempted:
+        return NotificationOutcome.SKIPPED
+    if delivered:
+        return NotificationOutcome.SENT
+    return NotificationOutcome.QUEUED if queued else NotificationOutcome.FAILED
 
 
-async def process_user_notification(user_id: str, event, db: Session) -> None:
+async def process_user_notification(
+    user_id: str, event, db: AsyncSession
+) -> NotificationOutcome:
     """
     Main function to process notifications for a user.
     This handles the common logic of checking preferences and sending notifications.
     """
-    preferences = get_preferences_by_user_id(db, user_id)
+    preferences = await get_preferences_by_user_id(db, user_id)
     pref = next((p for p in preferences if p.event_type == event.event_type), None)
 
+    digest_buffer = DigestBuffer(event)
+    delivery_log = DeliveryLog(db, event)
+    await delivery_log.load([user_id])
+    try:
+        return await notify_with_preference(
+            user_id, event, pref, None, digest_buffer, delivery_log
+        )
+    finally:
+        # Recorded even when a transient failure retries the event
+        await flush_fan_out(db, None, digest_buffer, delivery_log)
+
+
+async def notify_with_preference(
+    user_id: str,
+    event,
+    pref: Optional[NotificationPreferences],
+    push_dispatcher: Optional[PushDispatcher] = None,
+    digest_buffer: Optional[DigestBuffer] = None,
+    delivery_log: Optional[DeliveryLog] = None,
+) -> NotificationOutcome:
+    """
+    Send the event to a user whose preference was already loaded,
+    e.g. in bulk with get_preferences_by_user_ids.
+
+    Users with a digest frequency get the email queued on digest_buffer
+    instead of sent right away; the caller flushes it once for all recipients.
+    """
     if not pref:
-        logger.info(f"No matching preference found for event type {event.event_type}")
-        return
+        logger.info(
+            "No matching preference found for event type %s",
+            event.event_type,
+            extra=SAMPLED,
+        )
+        return NotificationOutcome.SKIPPED
 
-    await send_notifications_based_on_preferences(
-        user_id, event, pref.email_enabled, pref.push_enabled
+    email_enabled = pref.email_enabled
+    digested = False
+    if (
+        email_enabled
+        and digest_buffer is not None
+        and pref.digest_frequency != DigestFrequency.IMMEDIATE
+    ):
+        if delivery_log is None or not delivery_log.delivered(
+            user_id, DeliveryChannel.DIGEST
+        ):
+            digest_buffer.add(user_id, pref.digest_frequency)
+            digested = True
+        email_enabled = False
+
+    outcome = await send_notifications_based_on_preferences(
+        user_id,
+        event,
+        email_enabled,
+        pref.push_enabled,
+        push_dispatcher,
+        delivery_log,
     )
+    if digested and outcome in (
+        NotificationOutcome.SKIPPED,
+        NotificationOutcome.QUEUED,
+    ):
+        return NotificationOutcome.SENT
+    return outcome
+
+
+async def flush_fan_out(
+    db: AsyncSession,
+    push_dispatcher: Optional[PushDispatcher],
+    digest_buffer: DigestBuffer,
+    delivery_log: DeliveryLog,
+    summary: Optional[FanoutSummary] = None,
+) -> None:
+    """
+    Send the queued pushes and store the queued digest emails of a fan-out,
+    then record both in the send-log along with the emails already sent.
+    The fan-out's recipients left QUEUED are settled by whether their push
+    went out, and transient push failures are added to its summary.
+    """
+    if push_dispatcher is not None:
+        pushed = await push_dispatcher.flush()
+        await delivery_log.record_many(pushed, DeliveryChannel.PUSH)
+        if summary is not None:
+            summary.settle_queued(pushed)
+            summary.errors.extend(push_dispatcher.errors)
+    digested = await digest_buffer.flush(db)
+    await delivery_log.record_many(digested, DeliveryChannel.DIGEST)
+    await delivery_log.flush()
@@ -1,6 +1,107 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import random
 import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
+from src.utils.context import log_context
+
+# "text" keeps the human readable format, "json" writes one object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Share of sampled records (per-recipient success lines) that are written
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+
+# Pass as extra= on high-volume lines that may be sampled out
+SAMPLED = {"sampled": True}
+
+_queue_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """
+    Drops sampled records according to LOG_SAMPLE_RATE and copies the
+    event_id/event_type/lane/recipient of the calling task onto the record,
+    since the listener thread formats it outside that context.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False) and random.random() >= LOG_SAMPLE_RATE:
+            return False
+        for key, value in log_context().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("event_id", "event_type", "lane", "recipient"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
+    # The queue never leaves the process, so the record is enqueued as is and
+    # its message is only formatted by the listener thread
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _build_formatter() -> logging.Formatter:
+    if LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
+def _get_queue_handler() -> QueueHandler:
+    """
+    Create the process-wide queue handler on first use. Records are written
+    to stdout by a background listener thread, so logging never blocks the
+    event loop on the stream.
+    """
+    global _queue_handler, _listener
+    if _queue_handler is None:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(_build_formatter())
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = _LazyQueueHandler(log_queue)
+        _queue_handler.addFilter(ContextFilter())
+        _listener = QueueListener(log_queue, console_handler)
+        _listener.start()
+        atexit.register(stop_logging)
+    return _queue_handler
+
+
+def stop_logging() -> None:
+    """Write the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def setup_logger(name: Optional[str] = None) -> logging.Logger:
@@ -14,24 +115,14 @@ def setup_logger(name: Optional[str] = None) -> logging.Logger:
     Returns:
         logging.Logger: Configured logger instance
     """
-    # Create formatter
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-
-    # Create console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-
     # Get logger
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(LOG_LEVEL)
 
     # Remove existing handlers to avoid duplicates
     logger.handlers = []
 
-    # Add handler
-    logger.addHandler(console_handler)
+    # Every logger shares the queue handler
+    logger.addHandler(_get_queue_handler())
 
     return logger
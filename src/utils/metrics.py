@@ -0,0 +1,106 @@
+import os
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from src.utils.cache import CACHES
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Port of the /metrics endpoint, unset disables it. Worker N of the
+# supervisor listens on METRICS_PORT + N
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+EVENTS_PROCESSED = Counter(
+    "events_processed_total",
+    "Consumed messages by event type and outcome",
+    ["event_type", "outcome"],
+)
+EVENTS_IN_FLIGHT = Gauge("events_in_flight", "Messages currently being handled")
+EVENT_DURATION = Histogram(
+    "event_handler_seconds",
+    "Time spent in the event handler",
+    ["event_type"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+DECODE_DURATION = Histogram(
+    "event_decode_seconds",
+    "Time spent decoding a message body",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005),
+)
+PREFERENCE_LOOKUP_DURATION = Histogram(
+    "preference_lookup_seconds",
+    "Time spent loading notification preferences",
+    ["mode"],
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_seconds",
+    "Time spent in HTTP calls to other services",
+    ["upstream", "operation"],
+)
+SMTP_SEND_DURATION = Histogram(
+    "smtp_send_seconds", "Time spent sending one email", ["outcome"]
+)
+FCM_SEND_DURATION = Histogram(
+    "fcm_send_seconds", "Time spent sending one FCM multicast batch", ["outcome"]
+)
+FANOUT_SIZE = Histogram(
+    "fanout_size",
+    "Recipients per fan-out",
+    ["event_type"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+FANOUT_RECIPIENTS = Counter(
+    "fanout_recipients_total",
+    "Fan-out recipients by event type and outcome",
+    ["event_type", "outcome"],
+)
+RECIPIENTS_IN_FLIGHT = Gauge(
+    "fanout_recipients_in_flight", "Recipients currently being notified"
+)
+CIRCUIT_BREAKER_STATE = Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker of each upstream: 0 closed, 1 half-open, 2 open",
+    ["upstream"],
+)
+CIRCUIT_BREAKER_REJECTED = Counter(
+    "circuit_breaker_rejected_total",
+    "Calls failed fast because the upstream's circuit breaker was open",
+    ["upstream"],
+)
+RATE_LIMIT_WAIT = Histogram(
+    "rate_limit_wait_seconds",
+    "Time spent waiting for the rate limit of an upstream",
+    ["upstream"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+class CacheCollector:
+    """Exports the hit/miss/eviction counters and size of every TTLCache."""
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        evictions = CounterMetricFamily(
+            "cache_evictions", "Cache LRU evictions", labels=["cache"]
+        )
+        size = GaugeMetricFamily("cache_size", "Cached entries", labels=["cache"])
+        for name, cache in CACHES.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            evictions.add_metric([name], stats["evictions"])
+            size.add_metric([name], stats["size"])
+        yield from (hits, misses, evictions, size)
+
+
+REGISTRY.register(CacheCollector())
+
+
+def start_metrics_server(worker_index: int = 0) -> None:
+    """Expose /metrics over HTTP if METRICS_PORT is set."""
+    if not METRICS_PORT:
+        return
+    port = int(METRICS_PORT) + worker_index
+    start_http_server(port)
+    logger.info("Metrics available on port %s", port)
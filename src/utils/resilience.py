@@ -0,0 +1,212 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import AsyncIterator, Callable, Dict, Optional
+from src.utils.logger import setup_logger
+from src.utils.metrics import (
+    CIRCUIT_BREAKER_REJECTED,
+    CIRCUIT_BREAKER_STATE,
+    RATE_LIMIT_WAIT,
+)
+
+logger = setup_logger(__name__)
+
+# Consecutive failures that open the circuit breaker of an upstream, and
+# seconds it stays open before one probe call is let through. Each one can be
+# overridden per upstream, e.g. CIRCUIT_FAILURE_THRESHOLD_SMTP=3
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# Calls per second allowed to each upstream, 0 disables the limit. Override
+# with RATE_LIMIT_<NAME> and the burst with RATE_LIMIT_BURST_<NAME>
+DEFAULT_RATE_LIMITS = {
+    "courses": 0,
+    "users": 0,
+    "gateway": 0,
+    "smtp": 0,
+    "fcm": 0,
+}
+
+
+class CircuitState(Enum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit breaker of {name} is open")
+        self.name = name
+
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average and bursts of up to `burst`.
+    Callers reserve their token right away and sleep until it is due, so
+    waiters are served in order.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> float:
+        """Take one token, waiting for it if needed. Returns the seconds waited."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        delay = -self._tokens / self.rate
+        await asyncio.sleep(delay)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Fails calls to an upstream fast after `failure_threshold` consecutive
+    failures. After `reset_timeout` seconds a single probe call is let
+    through: its success closes the circuit again, its failure reopens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        CIRCUIT_BREAKER_STATE.labels(name).set(self.state.value)
+
+    def _set_state(self, state: CircuitState) -> None:
+        if state != self.state:
+            logger.warning(
+                "Circuit breaker of %s is now %s", self.name, state.name.lower()
+            )
+            self.state = state
+            CIRCUIT_BREAKER_STATE.labels(self.name).set(state.value)
+
+    def before_call(self) -> bool:
+        """
+        Let a call through or raise CircuitOpenError.
+        Returns whether the call is the probe of a half-open circuit.
+        """
+        if (
+            self.state == CircuitState.OPEN
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            self._set_state(CircuitState.HALF_OPEN)
+        if self.state == CircuitState.OPEN or (
+            self.state == CircuitState.HALF_OPEN and self._probing
+        ):
+            CIRCUIT_BREAKER_REJECTED.labels(self.name).inc()
+            raise CircuitOpenError(self.name)
+        if self.state == CircuitState.HALF_OPEN:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, failed: bool) -> None:
+        """Record the outcome of a call that was let through."""
+        if not failed:
+            self._failures = 0
+            # An open circuit is only closed again once it went half-open
+            if self.state == CircuitState.HALF_OPEN:
+                self._set_state(CircuitState.CLOSED)
+            return
+        self._failures += 1
+        if (
+            self.state == CircuitState.HALF_OPEN
+            or self._failures >= self.failure_threshold
+        ):
+            self._opened_at = time.monotonic()
+            self._set_state(CircuitState.OPEN)
+
+    def end_probe(self) -> None:
+        self._probing = False
+
+
+class UpstreamCall:
+    """Handle of a protected call, to report a failure that raised nothing."""
+
+    def __init__(self):
+        self.failed = False
+
+    def mark_failed(self) -> None:
+        self.failed = True
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_buckets: Dict[str, Optional[TokenBucket]] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        suffix = name.upper()
+        breaker = _breakers[name] = CircuitBreaker(
+            name,
+            int(
+                os.getenv(
+                    f"CIRCUIT_FAILURE_THRESHOLD_{suffix}",
+                    str(CIRCUIT_FAILURE_THRESHOLD),
+                )
+            ),
+            float(
+                os.getenv(f"CIRCUIT_RESET_SECONDS_{suffix}", str(CIRCUIT_RESET_SECONDS))
+            ),
+        )
+    return breaker
+
+
+def get_rate_limiter(name: str) -> Optional[TokenBucket]:
+    """Token bucket of an upstream, None if it is not rate limited."""
+    if name not in _buckets:
+        suffix = name.upper()
+        rate = float(
+            os.getenv(f"RATE_LIMIT_{suffix}", str(DEFAULT_RATE_LIMITS.get(name, 0)))
+        )
+        burst = float(os.getenv(f"RATE_LIMIT_BURST_{suffix}", str(max(rate, 1))))
+        _buckets[name] = TokenBucket(rate, burst) if rate > 0 else None
+    return _buckets[name]
+
+
+@asynccontextmanager
+async def protect(
+    name: str, is_failure: Callable[[Exception], bool] = lambda e: True
+) -> AsyncIterator[UpstreamCall]:
+    """
+    Run the block as one call to an upstream ("courses", "users", "gateway",
+    "smtp" or "fcm"): fail fast with CircuitOpenError while its breaker is
+    open, then wait for its rate limit.
+
+    Exceptions raised by the block count as failures of the upstream when
+    is_failure says so; the block can also report one with mark_failed().
+    """
+    breaker = get_breaker(name)
+    probe = breaker.before_call()
+    call = UpstreamCall()
+    try:
+        bucket = get_rate_limiter(name)
+        if bucket is not None:
+            RATE_LIMIT_WAIT.labels(name).observe(await bucket.acquire())
+        try:
+            yield call
+        except Exception as e:
+            if is_failure(e):
+                call.mark_failed()
+            breaker.record(call.failed)
+            raise
+        breaker.record(call.failed)
+    finally:
+        if probe:
+            breaker.end_probe()
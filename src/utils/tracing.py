@@ -0,0 +1,92 @@
+import os
+from typing import Any, Mapping, MutableMapping, Optional
+from opentelemetry import propagate, trace
+from opentelemetry.context import Context
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Where finished spans go: "none" (tracing disabled), "console" (stdout),
+# "file" (JSON lines in TRACING_FILE) or "otlp" (needs the OTLP exporter package)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "events-service")
+
+# Spans are no-ops until setup_tracing() installs a provider
+tracer = trace.get_tracer("events-service")
+
+
+def _json_line(span) -> str:
+    return span.to_json(indent=None) + os.linesep
+
+
+def _build_exporter(name: str):
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "file":
+        return ConsoleSpanExporter(
+            out=open(TRACING_FILE, "a", encoding="utf-8"), formatter=_json_line
+        )
+    if name == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter,
+            )
+        except ImportError:
+            logger.error(
+                "TRACING_EXPORTER=otlp requires opentelemetry-exporter-otlp-proto-http"
+            )
+            return None
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        return OTLPSpanExporter()
+    logger.error("Unknown TRACING_EXPORTER %s, tracing disabled", name)
+    return None
+
+
+def setup_tracing(worker_index: int = 0) -> None:
+    """Install the tracer provider and exporter selected by TRACING_EXPORTER."""
+    if TRACING_EXPORTER in ("", "none"):
+        return
+    exporter = _build_exporter(TRACING_EXPORTER)
+    if exporter is None:
+        return
+    provider = TracerProvider(
+        resource=Resource.create(
+            {
+                "service.name": TRACING_SERVICE_NAME,
+                "service.instance.id": f"{os.getpid()}-{worker_index}",
+            }
+        )
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    logger.info("Tracing enabled with %s exporter", TRACING_EXPORTER)
+
+
+def shutdown_tracing() -> None:
+    """Flush pending spans to the exporter."""
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
+
+
+def extract_context(headers: Optional[Mapping[str, Any]]) -> Context:
+    """
+    Get the trace context a publisher put in the AMQP headers (W3C
+    traceparent/tracestate), so the consumer span joins the producer's trace.
+    """
+    carrier = {}
+    for key, value in (headers or {}).items():
+        if isinstance(value, bytes):
+            value = value.decode("utf-8", errors="replace")
+        carrier[key] = str(value)
+    return propagate.extract(carrier)
+
+
+def inject_context(headers: MutableMapping[str, Any]) -> MutableMapping[str, Any]:
+    """Add the current trace context to outgoing headers (AMQP or HTTP)."""
+    propagate.inject(headers)
+    return headers